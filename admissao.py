@@ -0,0 +1,175 @@
+"""
+Controle de admissão para a geração de guias.
+
+Cada guia abre um workbook openpyxl e um processo soffice; sem limite, um
+pico de requisições derruba o container por falta de memória. Aqui ficam:
+    - um limite de guias renderizando ao mesmo tempo;
+    - uma fila de espera limitada (quem passa do limite da fila recebe 429);
+    - um tempo máximo de espera na fila (quem estoura recebe 503);
+    - saída da fila de quem desconectou enquanto esperava (sem usar vaga);
+    - métricas de profundidade de fila e tempo de espera.
+
+Configuração por variáveis de ambiente:
+    IPSEMG_MAX_GUIAS_SIMULTANEAS  guias renderizando ao mesmo tempo (padrão: nº de CPUs)
+    IPSEMG_MAX_FILA_GUIAS         requisições aguardando vaga (padrão: 2x o limite)
+    IPSEMG_TIMEOUT_FILA_GUIAS     segundos máximos de espera na fila (padrão: 15)
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+MAX_GUIAS_SIMULTANEAS = int(os.getenv("IPSEMG_MAX_GUIAS_SIMULTANEAS", os.cpu_count() or 1))
+MAX_FILA_GUIAS = int(os.getenv("IPSEMG_MAX_FILA_GUIAS", 2 * MAX_GUIAS_SIMULTANEAS))
+TIMEOUT_FILA_GUIAS = float(os.getenv("IPSEMG_TIMEOUT_FILA_GUIAS", "15"))
+
+
+class ControleAdmissao:
+    """
+    Semáforo com fila limitada e métricas. Só é usado de dentro do event
+    loop, então os contadores não precisam de lock.
+    """
+
+    def __init__(self, nome: str, limite: int, max_fila: int, timeout_fila: float):
+        self.nome = nome
+        self.limite = max(1, limite)
+        self.max_fila = max(0, max_fila)
+        self.timeout_fila = timeout_fila
+        self._semaforo = asyncio.Semaphore(self.limite)
+
+        self.em_execucao = 0
+        self.na_fila = 0
+        self.fila_maxima_observada = 0
+        self.total_admitidas = 0
+        self.total_rejeitadas_fila_cheia = 0
+        self.total_rejeitadas_timeout = 0
+        self.total_desistencias_fila = 0
+        self._esperas = deque(maxlen=1000)     # segundos esperando vaga
+        self._duracoes = deque(maxlen=1000)    # segundos renderizando
+
+    # -------------------------------------------------
+    # ADMISSÃO
+    # -------------------------------------------------
+
+    def _retry_after(self) -> str:
+        """
+        Estimativa (em segundos) de quando vale a pena tentar de novo:
+        tempo médio de render * (fila / limite), no mínimo 1s.
+        """
+        duracao_media = (sum(self._duracoes) / len(self._duracoes)) if self._duracoes else 5.0
+        estimativa = duracao_media * (self.na_fila + 1) / self.limite
+        return str(max(1, math.ceil(estimativa)))
+
+    def _rejeitar(self, status_code: int, mensagem: str):
+        raise HTTPException(
+            status_code=status_code,
+            detail=mensagem,
+            headers={"Retry-After": self._retry_after()},
+        )
+
+    async def _aguardar_vaga(self, desistencia):
+        """
+        Espera o semáforo até timeout_fila, ou até `desistencia` (future que
+        termina quando o cliente desconecta) terminar. Retorna True se
+        pegou a vaga, False no timeout; levanta 499 se o cliente desistiu.
+        """
+        aquisicao = asyncio.ensure_future(self._semaforo.acquire())
+        esperas = {aquisicao}
+        if desistencia is not None and not desistencia.done():
+            esperas.add(desistencia)
+        await asyncio.wait(esperas, timeout=self.timeout_fila, return_when=asyncio.FIRST_COMPLETED)
+        if aquisicao.done():
+            return True
+
+        aquisicao.cancel()
+        try:
+            await aquisicao
+        except asyncio.CancelledError:
+            pass
+        else:
+            # a vaga abriu junto com o cancelamento: devolve
+            self._semaforo.release()
+
+        if desistencia is not None and desistencia.done() and not desistencia.cancelled() \
+                and desistencia.exception() is None:
+            self.total_desistencias_fila += 1
+            raise HTTPException(status_code=499, detail="Cliente desconectou")
+        return False
+
+    @asynccontextmanager
+    async def vaga(self, desistencia=None):
+        """
+        Aguarda uma vaga de render. Rejeita na hora (429) se a fila estiver
+        cheia, ou com 503 se a vaga não abrir dentro de timeout_fila.
+        `desistencia` (opcional) é um future que termina quando o cliente
+        desconecta: quem desiste sai da fila com 499, sem ocupar vaga.
+        """
+        inicio_espera = time.monotonic()
+        if not self._semaforo.locked():
+            # há vaga livre: acquire() retorna sem suspender
+            await self._semaforo.acquire()
+        else:
+            if self.na_fila >= self.max_fila:
+                self.total_rejeitadas_fila_cheia += 1
+                self._rejeitar(429, f"Servidor ocupado ({self.nome}): fila de espera cheia")
+
+            self.na_fila += 1
+            self.fila_maxima_observada = max(self.fila_maxima_observada, self.na_fila)
+            try:
+                admitida = await self._aguardar_vaga(desistencia)
+            finally:
+                self.na_fila -= 1
+            if not admitida:
+                self.total_rejeitadas_timeout += 1
+                self._rejeitar(503, f"Servidor ocupado ({self.nome}): tempo de espera esgotado")
+
+        self._esperas.append(time.monotonic() - inicio_espera)
+        self.total_admitidas += 1
+        self.em_execucao += 1
+        inicio_execucao = time.monotonic()
+        try:
+            yield
+        finally:
+            self._duracoes.append(time.monotonic() - inicio_execucao)
+            self.em_execucao -= 1
+            self._semaforo.release()
+
+    # -------------------------------------------------
+    # MÉTRICAS
+    # -------------------------------------------------
+
+    def metricas(self) -> dict:
+        esperas = sorted(self._esperas)
+
+        def percentil(p: float) -> float:
+            if not esperas:
+                return 0.0
+            return round(esperas[min(len(esperas) - 1, int(p * len(esperas)))], 4)
+
+        return {
+            "limite": self.limite,
+            "max_fila": self.max_fila,
+            "em_execucao": self.em_execucao,
+            "na_fila": self.na_fila,
+            "fila_maxima_observada": self.fila_maxima_observada,
+            "total_admitidas": self.total_admitidas,
+            "total_rejeitadas_fila_cheia": self.total_rejeitadas_fila_cheia,
+            "total_rejeitadas_timeout": self.total_rejeitadas_timeout,
+            "total_desistencias_fila": self.total_desistencias_fila,
+            "espera_p50_s": percentil(0.50),
+            "espera_p95_s": percentil(0.95),
+            "espera_max_s": round(esperas[-1], 4) if esperas else 0.0,
+        }
+
+
+# instância única: SADT e internação disputam o mesmo soffice / memória
+controle_guias = ControleAdmissao(
+    "guias",
+    limite=MAX_GUIAS_SIMULTANEAS,
+    max_fila=MAX_FILA_GUIAS,
+    timeout_fila=TIMEOUT_FILA_GUIAS,
+)
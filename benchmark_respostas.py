@@ -0,0 +1,165 @@
+"""
+Benchmark das respostas: custo de serialização e bytes na rede.
+
+Compara, para a busca (/buscar-chbpm, /buscar-chbpm-lote) e para a resposta
+JSON das guias (completa x enxuta):
+    - serialização padrão do FastAPI (jsonable_encoder + JSONResponse)
+      x RespostaJson (orjson, se instalado);
+    - bytes sem compressão x gzip x brotli (se o pacote brotli existir);
+    - bytes transferidos de ponta a ponta pela API (TestClient), com e sem
+      Accept-Encoding.
+
+Uso:
+    python benchmark_respostas.py
+    python benchmark_respostas.py --repeticoes 2000
+"""
+import argparse
+import gzip
+import logging
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+import respostas_ipsemg
+from busca_cbhpm import buscar_chbpm
+from respostas_ipsemg import RespostaJson
+
+EXAMES = [
+    "hemograma", "rx cranio", "colesterol total", "tomografia de torax", "ultrassom abdome",
+    "creatinina", "glicose", "tsh", "ecocardiograma", "ressonancia magnetica joelho",
+    "eletrocardiograma", "endoscopia digestiva alta", "colonoscopia", "ureia", "vhs",
+    "hemoglobina glicada", "tgo", "tgp", "potassio", "sodio",
+]
+
+PAYLOAD_GUIA = {
+    "nome_beneficiario": "MARIA DAS GRACAS DE OLIVEIRA",
+    "operadora": "IPSEMG",
+    "prestador": "HOSPITAL EXEMPLO",
+    "matricula": "123456789012",
+    "sexo": "F",
+    "uf": "MG",
+    "especialidade": "CARDIOLOGIA",
+    "crm": "12345",
+    "carater": "ELETIVO",
+    "cid": "I10",
+    "solicitante": "DR. JOAO DA SILVA",
+    "indicacao_clinica": "Paciente com hipertensão arterial sistêmica em acompanhamento, "
+                         "solicito exames de rotina para controle.",
+    "tratamentos_realizados": None,
+    "hipotese": "HAS",
+    "codigos": ["4.03.04.36-1", "4.03.01.60-5", "4.03.02.04-0", "4.01.01.01-0", "4.09.01.10-6"],
+    "descricao": ["HEMOGRAMA COM CONTAGEM DE PLAQUETAS OU FRACOES", "COLESTEROL TOTAL", "GLICOSE",
+                  "ELETROCARDIOGRAMA - ECG (INCLUI LAUDO)", "ECOCARDIOGRAMA TRANSTORACICO A CORES"],
+    "quantidades": [1, 1, 1, 1, 1],
+    "tipo_internacao": None,
+    "regime": None,
+    "codigo_operadora": None,
+    "data_nascimento": "01/01/1960",
+    "assinatura": "DR. JOAO DA SILVA",
+    "data": "06/12/2025",
+}
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def medir(func, repeticoes: int) -> float:
+    """
+    Microssegundos por chamada (melhor de 3 rodadas).
+    """
+    melhor = float("inf")
+    for _ in range(3):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            func()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor / repeticoes * 1e6
+
+
+def comparar(nome: str, conteudo, repeticoes: int):
+    padrao = medir(lambda: JSONResponse(jsonable_encoder(conteudo)).body, repeticoes)
+    rapido = medir(lambda: RespostaJson(conteudo).body, repeticoes)
+    bruto = RespostaJson(conteudo).body
+    gz = len(gzip.compress(bruto, respostas_ipsemg.COMPRESSAO_NIVEL_GZIP))
+    brotli = _brotli()
+    br = len(brotli.compress(bruto, quality=respostas_ipsemg.COMPRESSAO_QUALIDADE_BROTLI)) if brotli else None
+
+    print(f"{nome:<28} {padrao:>10.1f} {rapido:>10.1f} {padrao / rapido:>7.1f}x "
+          f"{len(bruto):>9} {gz:>8} {br if br is not None else '-':>8}")
+
+
+def ponta_a_ponta():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    # o import do main configura o logger do IPSEMG de novo (nível INFO)
+    logging.getLogger("IPSEMG").setLevel(logging.WARNING)
+    cliente = TestClient(main.app)
+    print(f"\nPonta a ponta (bytes transferidos no corpo; compressão: {main.COMPRESSAO_ATIVA}, "
+          f"mínimo {respostas_ipsemg.COMPRESSAO_MIN_BYTES} bytes):")
+    print(f"{'rota':<28} {'identity':>9} {'gzip':>8} {'br':>8}")
+    for rota, corpo in (
+        ("/buscar-chbpm", {"exame": "hemograma"}),
+        ("/buscar-chbpm-lote", {"exames": EXAMES * 5}),
+    ):
+        bytes_por_codificacao = []
+        for codificacao in ("identity", "gzip", "br"):
+            resposta = cliente.post(rota, json=corpo, headers={"Accept-Encoding": codificacao})
+            usada = resposta.headers.get("content-encoding", "identity")
+            bytes_por_codificacao.append(
+                f"{resposta.num_bytes_downloaded}" + ("" if usada == codificacao else f"({usada})")
+            )
+        print(f"{rota:<28} {bytes_por_codificacao[0]:>9} {bytes_por_codificacao[1]:>8} {bytes_por_codificacao[2]:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de serialização e compressão das respostas.")
+    parser.add_argument("--repeticoes", type=int, default=500, help="chamadas por medição (padrão 500)")
+    parser.add_argument("--sem-api", action="store_true", help="não mede ponta a ponta pela API")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("IPSEMG").setLevel(logging.WARNING)
+
+    busca = buscar_chbpm("hemograma")
+    lote = {"resultados": [buscar_chbpm(exame) for exame in EXAMES * 5]}
+    guia_completa = {
+        "status": "ok",
+        "mensagem": "GUIA IPSEMG SADT preenchida com sucesso",
+        "arquivo_xlsx": "/tmp/0123456789abcdef0123456789abcdef/ipsemg_sadt_output.xlsx",
+        "arquivos_xlsx": ["/tmp/0123456789abcdef0123456789abcdef/ipsemg_sadt_output.xlsx"],
+        "paginas": 1,
+        "arquivo_pdf": "/tmp/0123456789abcdef0123456789abcdef/ipsemg_sadt_output_1pag_final.pdf",
+        "guia_id": "0123456789abcdef0123456789abcdef",
+        "payload": PAYLOAD_GUIA,
+    }
+    guia_enxuta = {
+        "status": "ok",
+        "guia_id": "0123456789abcdef0123456789abcdef",
+        "paginas": 1,
+        "url_pdf": respostas_ipsemg.link_assinado(
+            "/guias/0123456789abcdef0123456789abcdef/pdf", "0123456789abcdef0123456789abcdef"
+        ),
+    }
+
+    print(f"orjson: {'sim' if respostas_ipsemg.orjson else 'não (json padrão)'} | "
+          f"brotli: {'sim' if _brotli() else 'não'} | {args.repeticoes} repetições\n")
+    print(f"{'resposta':<28} {'padrão µs':>10} {'rápido µs':>10} {'ganho':>8} "
+          f"{'bytes':>9} {'gzip':>8} {'brotli':>8}")
+    comparar("busca (1 exame)", busca, args.repeticoes)
+    comparar(f"lote ({len(lote['resultados'])} exames)", lote, max(1, args.repeticoes // 20))
+    comparar("guia completa", guia_completa, args.repeticoes)
+    comparar("guia enxuta", guia_enxuta, args.repeticoes)
+
+    if not args.sem_api:
+        ponta_a_ponta()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Busca de códigos IPSEMG (CBHPM) por descrição ou código.
+
+Fica fora do main.py para poder ser usada sem subir a API (por exemplo pelo
+reconciliar_codigos.py, em processos separados), sem importar FastAPI,
+openpyxl ou PyMuPDF.
+
+Sinônimos e abreviações (sinonimos_ipsemg.json) entram no índice, não na
+consulta: na carga, cada descrição ganha variantes com os termos
+equivalentes ("rx cranio" -> "raio x cranio", "radiografia cranio"), e a
+busca segue sendo o mesmo filtro por substring + WRatio sobre as linhas do
+índice, sem custo extra por consulta.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+
+logger = logging.getLogger("IPSEMG")
+
+ARQUIVO_CODIGOS_IPSEMG = Path(__file__).resolve().parent / "ipsemg_refatorado.txt"
+ARQUIVO_SINONIMOS_IPSEMG = Path(__file__).resolve().parent / "sinonimos_ipsemg.json"
+
+# teto de variantes por descrição (descrições com termos de vários grupos
+# multiplicam as combinações)
+MAX_VARIANTES = 64
+
+# Carregar arquivo IPSEMG TXT (publicado de uma vez só, sob _dados_lock).
+# Uma linha por variante: {'normalizado', 'palavras', 'original', 'codigo'}
+dados_ipsemg_normalizados = []
+_indice_codigos = {}
+_dados_lock = threading.Lock()
+
+
+def normalizar_texto(texto: str) -> str:
+    texto = texto.lower()
+
+    # Remove acentos
+    texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
+
+    # Substituir caracteres especiais por espaço
+    substituicoes = {
+        '–': ' ', '-': ' ', '—': ' ', '−': ' ',
+        ',': ' ', '.': ' ', ';': ' ', ':': ' ',
+        '(': ' ', ')': ' ', '[': ' ', ']': ' ',
+        '{': ' ', '}': ' ', '<': ' ', '>': ' ',
+        '!': ' ', '?': ' ', '"': ' ', "'": ' ',
+        '&': ' ', '@': ' ', '#': ' ', '$': ' ',
+        '%': ' ', '*': ' ', '+': ' ', '=': ' ',
+        '/': ' ', '\\': ' ', '|': ' '
+    }
+    for original, sub in substituicoes.items():
+        texto = texto.replace(original, sub)
+
+    # Remover espaços extras
+    texto = ' '.join(texto.split())
+
+    return texto
+
+def carregar_sinonimos(caminho: Path = ARQUIVO_SINONIMOS_IPSEMG) -> list:
+    """
+    Grupos de termos equivalentes, já normalizados, cada grupo do termo
+    mais longo para o mais curto. Sem o arquivo, ou com ele inválido (JSON
+    quebrado, formato errado), a busca segue sem sinônimos.
+    """
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            grupos_brutos = json.load(f).get("grupos", [])
+
+        grupos = []
+        for grupo in grupos_brutos:
+            termos = {normalizar_texto(termo) for termo in grupo}
+            termos.discard("")
+            if len(termos) > 1:
+                grupos.append(sorted(termos, key=lambda t: (-len(t), t)))
+        return grupos
+    except FileNotFoundError:
+        logger.warning(f"Arquivo de sinônimos não encontrado: {caminho}")
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Arquivo de sinônimos inválido ({caminho}), busca sem sinônimos: {e}")
+    return []
+
+
+def expandir_variantes(texto: str, grupos: list) -> list:
+    """
+    O texto normalizado + uma variante para cada termo equivalente de cada
+    grupo presente nele (palavra inteira; por grupo, o termo mais longo que
+    aparecer). O próprio texto vem primeiro.
+    """
+    variantes = [texto]
+    vistas = {texto}
+    for grupo in grupos:
+        novas = []
+        for variante in variantes:
+            com_bordas = f" {variante} "
+            termo = next((t for t in grupo if f" {t} " in com_bordas), None)
+            if termo is None:
+                continue
+            for alternativo in grupo:
+                nova = com_bordas.replace(f" {termo} ", f" {alternativo} ").strip()
+                if nova not in vistas:
+                    vistas.add(nova)
+                    novas.append(nova)
+        variantes.extend(novas)
+        if len(variantes) >= MAX_VARIANTES:
+            return variantes[:MAX_VARIANTES]
+    return variantes
+
+
+def carregar_dados_cbhpm_ipsemg():
+    global dados_ipsemg_normalizados, _indice_codigos
+    if dados_ipsemg_normalizados:
+        return  # já carregado
+
+    with _dados_lock:
+        if dados_ipsemg_normalizados:
+            return  # outra thread carregou enquanto esperávamos
+
+        try:
+            grupos = carregar_sinonimos()
+            dados = []
+            indice_codigos = {}
+            total_descricoes = 0
+            with open(ARQUIVO_CODIGOS_IPSEMG, encoding="utf-8") as f:
+                linhas = f.readlines()
+            for linha in linhas:
+                linha = linha.strip()
+                match = re.match(r'^(\d{1,2}\.\d{2}\.\d{2}\.\d{2}-\d)\s+(.*)', linha)
+                if match:
+                    codigo = match.group(1)
+                    descricao = match.group(2)
+                    total_descricoes += 1
+                    for variante in expandir_variantes(normalizar_texto(descricao), grupos):
+                        dado = {
+                            'normalizado': variante,
+                            'palavras': frozenset(variante.split()),
+                            'original': descricao,
+                            'codigo': codigo
+                        }
+                        dados.append(dado)
+                        indice_codigos.setdefault(codigo.replace(".", "").replace("-", ""), dado)
+            # quem está lendo nunca vê o índice pela metade
+            _indice_codigos = indice_codigos
+            dados_ipsemg_normalizados = dados
+            logger.info(
+                f"Arquivo CODIGOS IPSEMG TXT carregado com {total_descricoes} entradas "
+                f"({len(dados)} linhas no índice com {len(grupos)} grupos de sinônimos)"
+            )
+        except Exception as e:
+            logger.error(f"Erro ao carregar arquivo CODIGOS IPSEMG TXT: {str(e)}")
+
+# === Buscar CBHPM ===
+def buscar_chbpm(exame: str, limite: int = 5):
+    from fuzzywuzzy import fuzz  # adiado para fora do cold start da API
+
+    carregar_dados_cbhpm_ipsemg()
+    try:
+        tempo_inicio = time.time()
+        termo_original = exame
+        logger.debug("Termo original: %s", exame)
+
+        # Normalizar o texto de entrada
+        tempo_normalizacao = time.time()
+        exame = normalizar_texto(exame)
+        logger.debug("Termo normalizado: %s", exame)
+
+        # Busca por código CHBPM normalizado
+        tempo_busca_codigo = time.time()
+        exame_strip = exame.strip()
+        if re.fullmatch(r'\d{8}', exame_strip):
+            dado = _indice_codigos.get(exame_strip)
+            if dado is not None:
+                logger.info("Busca CBHPM '%s' por código: 1 resultado em %.4fs",
+                            termo_original, time.time() - tempo_inicio)
+                return {
+                    "consulta": exame,
+                    "sugestoes": [{
+                        "descricao": dado['original'],
+                        "codigo": dado['codigo'],
+                        "score": 100
+                    }]
+                }
+        logger.debug("Tempo busca por código: %.4fs", time.time() - tempo_busca_codigo)
+
+        # Busca por expressão normalizada
+        tempo_preparacao = time.time()
+        stopwords = {"de", "do", "da", "e", "a", "o", "para", "por"}
+        termo_normalizado = ' '.join([
+            palavra for palavra in exame.split()
+            if palavra not in stopwords
+        ])
+
+        # Busca fuzzy otimizada
+        tempo_busca_fuzzy = time.time()
+        total_comparacoes = 0
+        if termo_normalizado.startswith("diaria"):
+            base_busca = [
+                dado for dado in dados_ipsemg_normalizados
+                if dado['normalizado'].startswith("diaria")
+            ]
+        else:
+            base_busca = [
+                dado for dado in dados_ipsemg_normalizados
+                if termo_normalizado in dado['normalizado']
+            ]
+
+            if not base_busca:
+                palavras = termo_normalizado.split()
+                base_busca = [
+                    dado for dado in dados_ipsemg_normalizados
+                    if all(p in dado['normalizado'] for p in palavras)
+                ]
+        palavras_busca = set(termo_normalizado.split())
+        # por descrição, fica a variante que melhor casou com a consulta
+        melhores = {}
+        for dado in base_busca:
+            total_comparacoes += 1
+            score = int(fuzz.WRatio(termo_normalizado, dado['normalizado']))
+            if score >= 70 or termo_normalizado in dado['normalizado']:
+                chave = (
+                    not palavras_busca.issubset(dado['palavras']),  # True vira 1, False vira 0 (queremos False primeiro)
+                    not dado['normalizado'].startswith(termo_normalizado),
+                    -score
+                )
+                atual = melhores.get((dado['codigo'], dado['original']))
+                if atual is None or chave < atual[0]:
+                    melhores[(dado['codigo'], dado['original'])] = (chave, dado, score)
+
+        # Ordenar resultados
+        tempo_ordenacao = time.time()
+        ordenados = sorted(melhores.values(), key=lambda item: item[0])
+
+        # Limitar a `limite` resultados (5 na API)
+        resultados = [
+            {'descricao': dado['original'], 'codigo': dado['codigo'], 'score': score}
+            for _, dado, score in ordenados[:limite]
+        ]
+        logger.debug("Tempo busca fuzzy: %.4fs (%d comparações)", tempo_ordenacao - tempo_busca_fuzzy, total_comparacoes)
+        logger.debug("Tempo ordenação: %.4fs", time.time() - tempo_ordenacao)
+        logger.info("Busca CBHPM '%s': %d resultados em %.4fs",
+                    termo_original, len(resultados), time.time() - tempo_inicio)
+
+        return {
+            "consulta": exame,
+            "sugestoes": resultados
+        }
+
+    except Exception as e:
+        logger.info(f"Erro na busca CBHPM: {str(e)}", exc_info=True)
+        return {"consulta": exame, "sugestoes": [], "erro": str(e)}
@@ -1,8 +1,22 @@
 import os
+import logging
 import subprocess
-import fitz
+import tempfile
+import threading
+import time
 from pathlib import Path
 
+from prazo_guia import (
+    MOTIVO_PRAZO,
+    RenderInterrompido,
+    finalizar_processo,
+    prazo_atual,
+    timeout_soffice,
+    verificar_prazo,
+)
+
+logger = logging.getLogger("IPSEMG")
+
 # ⚠️ LOCAL (WINDOWS): DIMITRIUS
 #SOFFICE = r"D:\Program Files\LibreOffice\program\soffice.exe"
 SOFFICE = None
@@ -19,6 +33,68 @@ def get_soffice_cmd() -> str:
     return "soffice"
 
 
+def get_soffice_profile_uri() -> str:
+    """
+    Perfil de usuário do LibreOffice exclusivo por processo/thread.
+    Duas instâncias do soffice com o mesmo perfil não rodam em paralelo
+    (a segunda tenta repassar o trabalho para a primeira), então cada
+    thread de render usa o seu, reaproveitado entre chamadas.
+    """
+    perfil = Path(tempfile.gettempdir()) / f"ipsemg_lo_{os.getpid()}_{threading.get_ident()}"
+    return perfil.as_uri()
+
+
+def _rodar_soffice(xlsx_files: list, out_dir: Path) -> None:
+    """
+    Uma única chamada do soffice convertendo todos os arquivos para PDF em out_dir.
+    """
+    soffice_cmd = get_soffice_cmd()
+
+    cmd = [
+        soffice_cmd,
+        f"-env:UserInstallation={get_soffice_profile_uri()}",
+        "--headless",
+        "--convert-to", "pdf",
+        "--outdir", str(out_dir),
+        *[str(f) for f in xlsx_files],
+    ]
+
+    verificar_prazo("soffice")
+    timeout = timeout_soffice(len(xlsx_files))
+    prazo = prazo_atual.get()
+
+    # Roda o LibreOffice pra converter. Sessão própria: no cancelamento o
+    # grupo inteiro (soffice + soffice.bin) é morto de uma vez.
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    if prazo is not None:
+        prazo.registrar_processo(proc)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        finalizar_processo(proc)
+        proc.communicate()
+        if prazo is not None:
+            prazo.interromper(MOTIVO_PRAZO)
+        raise RenderInterrompido(MOTIVO_PRAZO, f"soffice ({timeout:.0f}s)")
+    finally:
+        if prazo is not None:
+            prazo.remover_processo(proc)
+
+    # morto pelo vigia (cliente desconectou / prazo da guia)?
+    verificar_prazo("soffice")
+
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"Erro ao converter XLSX para PDF:\nSTDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
+        )
+
+
 def xlsx_to_pdf(xlsx_path: str, pdf_path: str | None = None) -> str:
     """
     Converte um XLSX em PDF usando LibreOffice (soffice) em modo headless.
@@ -41,31 +117,36 @@ def xlsx_to_pdf(xlsx_path: str, pdf_path: str | None = None) -> str:
 
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    soffice_cmd = get_soffice_cmd()
+    _rodar_soffice([xlsx_file], out_dir)
 
-    cmd = [
-        soffice_cmd,
-        "--headless",
-        "--convert-to", "pdf",
-        "--outdir", str(out_dir),
-        str(xlsx_file),
-    ]
+    # LibreOffice gera o PDF com o mesmo nome base do XLSX
+    return str(pdf_path)
 
-    # Roda o LibreOffice pra converter
-    result = subprocess.run(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-    )
 
-    if result.returncode != 0:
-        raise RuntimeError(
-            f"Erro ao converter XLSX para PDF:\nSTDOUT:\n{result.stdout}\n\nSTDERR:\n{result.stderr}"
-        )
+def xlsx_to_pdf_lote(xlsx_paths: list, out_dir: str | None = None) -> list:
+    """
+    Converte vários XLSX em PDF com UMA chamada do LibreOffice
+    (o custo de subir o soffice é pago uma vez só).
+    Retorna os caminhos dos PDFs, na mesma ordem da entrada.
+    """
+    xlsx_files = [Path(os.path.abspath(p)) for p in xlsx_paths]
+    for xlsx_file in xlsx_files:
+        if not xlsx_file.exists():
+            raise FileNotFoundError(f"XLSX não encontrado: {xlsx_file}")
 
-    # LibreOffice gera o PDF com o mesmo nome base do XLSX
-    return str(pdf_path)
+    if not xlsx_files:
+        return []
+
+    out_dir = Path(out_dir) if out_dir else xlsx_files[0].parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    _rodar_soffice(xlsx_files, out_dir)
+
+    pdfs = [out_dir / f.with_suffix(".pdf").name for f in xlsx_files]
+    faltando = [p.name for p in pdfs if not p.exists()]
+    if faltando:
+        raise RuntimeError(f"LibreOffice não gerou: {', '.join(faltando)}")
+    return [str(p) for p in pdfs]
 
 
 def manter_apenas_primeira_pagina(pdf_path: str) -> str:
@@ -74,6 +155,8 @@ def manter_apenas_primeira_pagina(pdf_path: str) -> str:
     NÃO sobrescreve o original. Gera: <nome>_1pag.pdf
     Retorna o caminho do novo PDF.
     """
+    import fitz  # adiado: PyMuPDF pesa no cold start (veja inicializacao.py)
+
     pdf_path = Path(pdf_path).resolve()
 
     if not pdf_path.exists():
@@ -90,7 +173,7 @@ def manter_apenas_primeira_pagina(pdf_path: str) -> str:
     new_doc.close()
     doc.close()
 
-    print(f"PDF reduzido para apenas 1 página: {out_path}")
+    logger.debug("PDF reduzido para apenas 1 página: %s", out_path)
     return str(out_path)
 
 
@@ -100,6 +183,8 @@ def aplicar_marca_dagua_fitz(pdf_path: str) -> str:
     NÃO sobrescreve o original. Gera: <nome>_marca.pdf
     Retorna o caminho do PDF com marca.
     """
+    import fitz
+
     pdf_path = Path(pdf_path).resolve()
 
     if not pdf_path.exists():
@@ -114,7 +199,7 @@ def aplicar_marca_dagua_fitz(pdf_path: str) -> str:
         width, height = page.rect.width, page.rect.height
         rotacao = page.rotation  # 0 para portrait, 90 para landscape
 
-        print(f"[DEBUG] Página {page_index} – width={width}, height={height}, rotation={rotacao}")
+        logger.debug("Página %d – width=%s, height=%s, rotation=%s", page_index, width, height, rotacao)
 
         if rotacao == 90:
             x = 26
@@ -162,17 +247,62 @@ def aplicar_marca_dagua_fitz(pdf_path: str) -> str:
     doc.save(str(out_path))
     doc.close()
 
-    print(f"Marca d'água aplicada com sucesso: {out_path}")
+    logger.debug("Marca d'água aplicada com sucesso: %s", out_path)
     return str(out_path)
 
 
+def _pixmap(imagem):
+    import fitz
+
+    return fitz.Pixmap(fitz.csRGB, imagem.width, imagem.height, imagem.tobytes(), imagem.mode == "RGBA")
+
+
+def _separar_fundo_comum(paginas: list):
+    """
+    Recebe as páginas rasterizadas (PIL, RGB, mesmo tamanho) e retorna
+    (fundo, sobreposicoes): o fundo tem os pixels iguais em todas as
+    páginas (formulário, logo, marca d'água) e branco no resto; cada
+    sobreposição (RGBA) tem só os pixels em que a página difere do fundo,
+    transparente no resto. Fundo + sobreposição reproduz a página exata.
+    """
+    from PIL import Image, ImageChops
+
+    def mascara_diferente(a, b):
+        # 255 onde algum canal difere (o "L" arredondaria diferenças pequenas)
+        r, g, b_ = ImageChops.difference(a, b).split()
+        return ImageChops.lighter(ImageChops.lighter(r, g), b_).point(lambda v: 255 if v else 0)
+
+    base = paginas[0]
+    diferente = Image.new("L", base.size, 0)
+    for pagina in paginas[1:]:
+        diferente = ImageChops.lighter(diferente, mascara_diferente(pagina, base))
+
+    branco = Image.new("RGB", base.size, "white")
+    fundo = Image.composite(branco, base, diferente)
+    sobreposicoes = []
+    for pagina in paginas:
+        alfa = mascara_diferente(pagina, fundo)
+        # branco sob a parte transparente: comprime bem melhor
+        sobreposicao = Image.composite(pagina, branco, alfa).convert("RGBA")
+        sobreposicao.putalpha(alfa)
+        sobreposicoes.append(sobreposicao)
+    return fundo, sobreposicoes
+
+
 def rasterizar_pdf(pdf_path: str, dpi: int = 150) -> str:
     """
     Recebe um PDF (tipicamente já com marca) e gera:
         <base>_final.pdf
     Rasterizado (imagem por página), para ficar não editável.
+
+    Com várias páginas do mesmo tamanho (guias de continuação), o que é
+    igual em todas vira uma imagem de fundo gravada uma vez e referenciada
+    por todas as páginas (mesmo xref); cada página só acrescenta a imagem,
+    quase toda transparente, do que muda nela.
     Retorna o caminho do PDF final.
     """
+    import fitz
+
     pdf_path = Path(pdf_path).resolve()
 
     if not pdf_path.exists():
@@ -181,12 +311,32 @@ def rasterizar_pdf(pdf_path: str, dpi: int = 150) -> str:
     doc = fitz.open(str(pdf_path))
     new_doc = fitz.open()
 
-    for page_index, page in enumerate(doc):
-        rect = page.rect
-        pix = page.get_pixmap(dpi=dpi, alpha=False)
+    if len(doc) > 1 and len({tuple(page.rect) for page in doc}) == 1:
+        from PIL import Image
+
+        rect = doc[0].rect
+        paginas = []
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
+            paginas.append(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+        fundo, sobreposicoes = _separar_fundo_comum(paginas)
+
+        xref_fundo = 0
+        for sobreposicao in sobreposicoes:
+            new_page = new_doc.new_page(width=rect.width, height=rect.height)
+            if xref_fundo:
+                new_page.insert_image(rect, xref=xref_fundo)
+            else:
+                xref_fundo = new_page.insert_image(rect, pixmap=_pixmap(fundo))
+            if sobreposicao.getchannel("A").getbbox():
+                new_page.insert_image(rect, pixmap=_pixmap(sobreposicao))
+    else:
+        for page in doc:
+            rect = page.rect
+            pix = page.get_pixmap(dpi=dpi, alpha=False)
 
-        new_page = new_doc.new_page(width=rect.width, height=rect.height)
-        new_page.insert_image(rect, pixmap=pix)
+            new_page = new_doc.new_page(width=rect.width, height=rect.height)
+            new_page.insert_image(rect, pixmap=pix)
 
     stem_base = pdf_path.stem
     if stem_base.endswith("_marca"):
@@ -194,11 +344,34 @@ def rasterizar_pdf(pdf_path: str, dpi: int = 150) -> str:
 
     out_path = pdf_path.with_name(stem_base + "_final.pdf")
 
-    new_doc.save(str(out_path), deflate=True)
+    new_doc.save(str(out_path), garbage=4, deflate=True)
     new_doc.close()
     doc.close()
 
-    print(f"PDF rasterizado (não editável) gerado: {out_path}")
+    logger.debug("PDF rasterizado (não editável) gerado: %s", out_path)
+    return str(out_path)
+
+
+def juntar_primeiras_paginas(pdf_paths: list, out_path: str) -> str:
+    """
+    Junta a primeira página de cada PDF em um único documento. É um
+    arquivo intermediário: o compartilhamento do fundo entre as páginas
+    acontece no rasterizar_pdf.
+    """
+    import fitz
+
+    out_path = Path(out_path).resolve()
+    new_doc = fitz.open()
+
+    for pdf_path in pdf_paths:
+        doc = fitz.open(str(pdf_path))
+        new_doc.insert_pdf(doc, from_page=0, to_page=0)
+        doc.close()
+
+    new_doc.save(str(out_path), garbage=4, deflate=True)
+    new_doc.close()
+
+    logger.debug("%d páginas juntadas em: %s", len(pdf_paths), out_path)
     return str(out_path)
 
 
@@ -232,35 +405,158 @@ def gerar_pdf_final(xlsx_path: str) -> str:
     # 1) Converter XLSX → PDF
     pdf_base = xlsx_to_pdf(xlsx_path)
 
+    # 2) a 4) primeira página, marca d'água e raster
+    return pos_processar_pdf(pdf_base)
+
+
+def pos_processar_pdf(pdf_base: str) -> str:
+    """
+    Etapas PyMuPDF do gerar_pdf_final sobre um PDF já convertido:
+    primeira página, marca d'água e raster. Só usa arquivos, então
+    pode rodar em outro processo (veja o modo diretório abaixo).
+    """
     # 2) Manter apenas a primeira página
+    verificar_prazo("primeira página")
     pdf_1pag = manter_apenas_primeira_pagina(pdf_base)
 
     # 3) Aplicar marca d'água
+    verificar_prazo("marca d'água")
     pdf_marca = aplicar_marca_dagua_fitz(pdf_1pag)
 
     # 4) Rasterizar, deixando imutável
+    verificar_prazo("raster")
     pdf_final = rasterizar_pdf(pdf_marca, dpi=150)
 
     return pdf_final
 
 
-if __name__ == "__main__":
-    base_dir = Path(__file__).resolve().parent
-    xlsx_files = list(base_dir.glob("*.xlsx"))
+def gerar_pdf_final_multiplo(xlsx_paths: list) -> str:
+    """
+    Mesmo fluxo do gerar_pdf_final, mas para várias guias (continuações)
+    que saem em um único PDF: uma chamada do soffice para todas, a primeira
+    página de cada uma juntada em <nome>_guias.pdf, marca d'água e raster
+    (com o fundo comum às guias gravado uma vez só, veja rasterizar_pdf).
 
-    if not xlsx_files:
-        print("Nenhum arquivo .xlsx encontrado na mesma pasta do script.")
-    else:
-        print(f"Encontrados {len(xlsx_files)} arquivo(s) .xlsx:")
-        for f in xlsx_files:
-            print(" -", f.name)
+    Retorna o caminho FINAL (<nome>_guias_final.pdf).
+    """
+    if len(xlsx_paths) == 1:
+        return gerar_pdf_final(xlsx_paths[0])
+
+    # 1) Converter todos os XLSX → PDF de uma vez
+    pdfs_base = xlsx_to_pdf_lote(xlsx_paths)
+
+    # 2) Juntar a primeira página de cada guia
+    verificar_prazo("juntar páginas")
+    primeiro = Path(pdfs_base[0])
+    pdf_guias = juntar_primeiras_paginas(pdfs_base, primeiro.with_name(primeiro.stem + "_guias.pdf"))
+
+    # 3) Aplicar marca d'água
+    verificar_prazo("marca d'água")
+    pdf_marca = aplicar_marca_dagua_fitz(pdf_guias)
+
+    # 4) Rasterizar, deixando imutável
+    verificar_prazo("raster")
+    return rasterizar_pdf(pdf_marca, dpi=150)
+
+
+def _final_esperado(xlsx_file: Path, saida: Path) -> Path:
+    return saida / f"{xlsx_file.stem}_1pag_final.pdf"
 
-        print("\nIniciando conversão para PDF + marca d'água + corte para 1 página + raster...\n")
 
-        for f in xlsx_files:
+def converter_diretorio(entrada: Path, saida: Path, lote: int = 20,
+                        processos: int | None = None, forcar: bool = False) -> dict:
+    """
+    Converte todos os *.xlsx de `entrada` para PDFs finais em `saida`:
+        - pula arquivos cujo <nome>_1pag_final.pdf já é mais novo que o XLSX;
+        - uma chamada do soffice por lote de `lote` arquivos;
+        - corte/marca/raster (pos_processar_pdf) em um pool de processos,
+          rodando enquanto o soffice já converte o lote seguinte.
+    Retorna um resumo com contagens e tempo.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    inicio = time.time()
+    saida.mkdir(parents=True, exist_ok=True)
+    xlsx_files = sorted(entrada.glob("*.xlsx"))
+
+    pendentes = []
+    pulados = 0
+    for f in xlsx_files:
+        final = _final_esperado(f, saida)
+        if not forcar and final.exists() and final.stat().st_mtime >= f.stat().st_mtime:
+            pulados += 1
+            continue
+        pendentes.append(f)
+
+    print(f"Encontrados {len(xlsx_files)} arquivo(s) .xlsx: {len(pendentes)} para converter, "
+          f"{pulados} já atualizado(s).\n")
+
+    ok, falhas = 0, 0
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count() or 1) as pool:
+        futuros = {}
+        for i in range(0, len(pendentes), max(1, lote)):
+            arquivos = pendentes[i:i + max(1, lote)]
+            inicio_lote = time.time()
+            try:
+                _rodar_soffice(arquivos, saida)
+            except Exception as e:
+                # segue: os PDFs que saíram antes do erro ainda são aproveitados
+                logger.error(f"Erro no soffice (lote {i // max(1, lote) + 1}): {e}")
+
+            for f in arquivos:
+                pdf_base = saida / f.with_suffix(".pdf").name
+                if pdf_base.exists() and pdf_base.stat().st_mtime >= inicio_lote - 1:
+                    futuros[pool.submit(pos_processar_pdf, str(pdf_base))] = f
+                else:
+                    falhas += 1
+                    print(f"[FALHA] {f.name}: LibreOffice não gerou o PDF\n")
+
+        for futuro, f in futuros.items():
             try:
-                pdf_final = gerar_pdf_final(str(f))
+                pdf_final = futuro.result()
+                ok += 1
                 print(f"[OK] PDF final gerado: {Path(pdf_final).name}\n")
             except Exception as e:
+                falhas += 1
                 print(f"[FALHA] {f.name}: {e}\n")
 
+    duracao = time.time() - inicio
+    return {
+        "total": len(xlsx_files),
+        "convertidos": ok,
+        "pulados": pulados,
+        "falhas": falhas,
+        "segundos": duracao,
+        "arquivos_por_segundo": ok / duracao if duracao else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    base_dir = Path(__file__).resolve().parent
+
+    parser = argparse.ArgumentParser(
+        description="Converte XLSX em PDF final (1 página + marca d'água + raster)."
+    )
+    parser.add_argument("entrada", nargs="?", type=Path, default=base_dir,
+                        help="pasta com os .xlsx (padrão: pasta do script)")
+    parser.add_argument("saida", nargs="?", type=Path, default=None,
+                        help="pasta dos PDFs (padrão: a mesma da entrada)")
+    parser.add_argument("--lote", type=int, default=20, help="arquivos por chamada do soffice (padrão 20)")
+    parser.add_argument("--processos", type=int, default=None,
+                        help="processos para corte/marca/raster (padrão: nº de CPUs)")
+    parser.add_argument("--forcar", action="store_true", help="reconverte mesmo os PDFs já atualizados")
+    args = parser.parse_args()
+
+    if not list(args.entrada.glob("*.xlsx")):
+        print(f"Nenhum arquivo .xlsx encontrado em {args.entrada}.")
+    else:
+        print("Iniciando conversão para PDF + marca d'água + corte para 1 página + raster...\n")
+        resumo = converter_diretorio(args.entrada, args.saida or args.entrada, args.lote,
+                                     args.processos, args.forcar)
+        print(
+            f"Resumo: {resumo['convertidos']} convertido(s), {resumo['pulados']} pulado(s), "
+            f"{resumo['falhas']} falha(s) em {resumo['segundos']:.1f}s "
+            f"({resumo['arquivos_por_segundo']:.2f} arquivos/s)"
+        )
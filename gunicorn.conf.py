@@ -0,0 +1,63 @@
+"""
+Modo produção: gunicorn com N workers uvicorn pré-forkados.
+
+    gunicorn -c gunicorn.conf.py main:app
+
+O main é importado UMA vez no processo pai (preload_app) e pre_carregar()
+deixa catálogo, logo e templates prontos antes do fork; os workers herdam
+essa memória por copy-on-write (gc.freeze evita que o GC do worker "suje"
+as páginas herdadas).
+
+Variáveis de ambiente:
+    PORT              porta (Cloud Run injeta; padrão 8000)
+    IPSEMG_WORKERS    nº de workers (padrão: nº de CPUs; WEB_CONCURRENCY também vale)
+    IPSEMG_LOG_ARQUIVO  padrão aqui é IPSEMG.{pid}.log (um arquivo por worker)
+
+Reload sem derrubar conexões:
+    kill -HUP <pid do master>    recria os workers de forma graciosa
+    kill -USR2 <pid do master>   sobe um master novo com o código novo
+                                 (depois -WINCH e -TERM no master antigo)
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("IPSEMG_WORKERS") or os.getenv("WEB_CONCURRENCY") or multiprocessing.cpu_count())
+worker_class = "uvicorn_worker.UvicornWorker"  # pacote uvicorn-worker (o uvicorn.workers está depreciado)
+preload_app = True
+
+# guia com soffice pode levar alguns segundos; não matar worker ocupado
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Os limites por processo (admissão e threads de preenchimento) são lidos
+# no import do main; divide os CPUs entre os workers para o total não
+# multiplicar pelo nº de workers.
+_cpus_por_worker = str(max(1, multiprocessing.cpu_count() // max(1, workers)))
+os.environ.setdefault("IPSEMG_MAX_GUIAS_SIMULTANEAS", _cpus_por_worker)
+os.environ.setdefault("IPSEMG_THREADS_PREENCHIMENTO", _cpus_por_worker)
+
+# Um arquivo de log por processo: com todos no mesmo IPSEMG.log, a rotação
+# feita por um worker faz os outros seguirem escrevendo no arquivo renomeado.
+os.environ.setdefault("IPSEMG_LOG_ARQUIVO", "IPSEMG.{pid}.log")
+
+
+def on_starting(server):
+    # preload_app já importou o main neste ponto (ainda no processo pai)
+    import main
+    from log_ipsemg import parar_logging
+
+    main.pre_carregar()
+
+    # a thread do listener de log não atravessa o fork: para aqui
+    # (esvaziando a fila) e cada worker sobe a sua no post_fork
+    parar_logging()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from log_ipsemg import iniciar_listener
+
+    iniciar_listener()
@@ -0,0 +1,149 @@
+"""
+Caminho de inicialização medido + aquecimento em segundo plano.
+
+No Cloud Run o cold start é latência que o usuário vê. Por isso o main.py
+não importa openpyxl, PyMuPDF nem fuzzywuzzy no topo: cada um é importado
+no primeiro uso, e logo depois que o servidor sobe uma thread "aquece" os
+subsistemas (importa as bibliotecas e carrega catálogo, logo e templates).
+
+Aqui ficam:
+    - o medidor de imports: custo acumulado de cada módulo de topo
+      importado durante o import do main (como a coluna "cumulative" do
+      python -X importtime, incluindo o que ele importa);
+    - o registro dos subsistemas e o estado de cada um (para /prontidao);
+    - o relatório de inicialização, logado ao fim do aquecimento.
+
+Só usa a biblioteca padrão, para poder ser importado antes de tudo.
+"""
+import builtins
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger("IPSEMG")
+
+_INICIO = time.perf_counter()
+
+
+class MedidorImports:
+    """
+    Enquanto ativo, envolve o __import__ e anota quanto tempo levou o
+    primeiro import de cada módulo de topo (o "fastapi" de "fastapi.routing").
+    """
+
+    def __init__(self):
+        self.custos = {}
+        self.total = None
+        self._original = None
+
+    def _importar(self, name, globals=None, locals=None, fromlist=(), level=0):
+        raiz = name.partition(".")[0]
+        if level or not raiz or raiz in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+
+        inicio = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            self.custos[raiz] = self.custos.get(raiz, 0.0) + time.perf_counter() - inicio
+
+    def iniciar(self):
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._importar
+
+    def parar(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+            self.total = time.perf_counter() - _INICIO
+
+    def maiores(self, quantidade: int = 15) -> dict:
+        ordenados = sorted(self.custos.items(), key=lambda item: -item[1])[:quantidade]
+        return {nome: round(segundos, 4) for nome, segundos in ordenados}
+
+
+medidor_imports = MedidorImports()
+
+
+def importar(nome: str):
+    """
+    importlib.import_module que também anota o custo no relatório: é assim
+    que os subsistemas importam as bibliotecas adiadas no aquecimento.
+    """
+    raiz = nome.partition(".")[0]
+    ja_importado = raiz in sys.modules
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nome)
+    if not ja_importado:
+        medidor_imports.custos[raiz] = time.perf_counter() - inicio
+    return modulo
+
+
+# -------------------------------------------------
+# SUBSISTEMAS / AQUECIMENTO
+# -------------------------------------------------
+
+_subsistemas = {}
+_subsistemas_lock = threading.Lock()
+_thread_aquecimento = None
+
+
+def registrar_subsistema(nome: str, aquecer):
+    """
+    `aquecer` é uma função sem argumentos, idempotente, que deixa o
+    subsistema pronto (importa o que precisa e carrega os dados).
+    """
+    _subsistemas[nome] = {"aquecer": aquecer, "pronto": False, "segundos": None, "erro": None}
+
+
+def aquecer():
+    """
+    Aquece todos os subsistemas, em ordem, na thread corrente. Um
+    subsistema que falha não impede os outros (e o uso sob demanda
+    continua valendo para ele).
+    """
+    with _subsistemas_lock:
+        for nome, subsistema in _subsistemas.items():
+            if subsistema["pronto"]:
+                continue
+            inicio = time.perf_counter()
+            try:
+                subsistema["aquecer"]()
+                subsistema["pronto"] = True
+                subsistema["erro"] = None
+            except Exception as e:
+                subsistema["erro"] = str(e)
+                logger.error(f"Erro ao aquecer {nome}: {e}")
+            subsistema["segundos"] = round(time.perf_counter() - inicio, 4)
+
+    logger.info(f"Inicialização: {relatorio()}")
+
+
+def aquecer_em_segundo_plano():
+    """
+    Dispara o aquecimento numa thread daemon e retorna na hora: o servidor
+    já atende (/versao, /prontidao) enquanto as bibliotecas carregam.
+    """
+    global _thread_aquecimento
+    if _thread_aquecimento is None:
+        _thread_aquecimento = threading.Thread(target=aquecer, name="aquecimento", daemon=True)
+        _thread_aquecimento.start()
+
+
+def pronto() -> bool:
+    return all(s["pronto"] for s in _subsistemas.values())
+
+
+def relatorio() -> dict:
+    return {
+        "pronto": pronto(),
+        "subsistemas": {
+            nome: {"pronto": s["pronto"], "segundos": s["segundos"], "erro": s["erro"]}
+            for nome, s in _subsistemas.items()
+        },
+        "import_main_s": round(medidor_imports.total, 4) if medidor_imports.total is not None else None,
+        "imports_s": medidor_imports.maiores(),
+    }
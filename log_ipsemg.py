@@ -0,0 +1,184 @@
+"""
+Logging do IPSEMG.
+
+Os handlers de arquivo (RotatingFileHandler) e de console ficam atrás de um
+QueueListener rodando em thread própria: quem loga (o event loop, as rotas)
+só enfileira o registro, sem pagar escrita em disco nem rotação do arquivo.
+
+Configuração por variáveis de ambiente:
+    IPSEMG_LOG_ARQUIVO           caminho do arquivo de log (padrão IPSEMG.log);
+                                 aceita "{pid}" para um arquivo por processo
+                                 (o gunicorn.conf.py usa IPSEMG.{pid}.log)
+    IPSEMG_LOG_FORMATO           "json" (padrão) ou "texto"
+    IPSEMG_LOG_AMOSTRAGEM_DEBUG  fração (0.0 a 1.0) das requisições que emitem
+                                 as linhas DEBUG de tempo. 0 desliga o DEBUG.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import zlib
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_ARQUIVO = os.getenv("IPSEMG_LOG_ARQUIVO", "IPSEMG.log")
+LOG_FORMATO = os.getenv("IPSEMG_LOG_FORMATO", "json").strip().lower()
+LOG_AMOSTRAGEM_DEBUG = float(os.getenv("IPSEMG_LOG_AMOSTRAGEM_DEBUG", "0") or 0)
+
+# id de correlação da requisição corrente (setado pelo middleware do main.py)
+correlation_id = contextvars.ContextVar("correlation_id", default="-")
+
+_listener = None
+_fila = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Uma linha JSON por registro.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "mensagem": record.getMessage(),
+        }
+        if record.exc_info:
+            dados["excecao"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados["excecao"] = record.exc_text
+        if record.stack_info:
+            dados["pilha"] = record.stack_info
+        return json.dumps(dados, ensure_ascii=False)
+
+
+class FilaHandler(QueueHandler):
+    """
+    QueueHandler que mantém o traceback separado da mensagem. O prepare()
+    padrão formata o registro inteiro em `msg` (traceback incluído) e zera
+    exc_info/exc_text, e aí o JsonFormatter nunca teria o campo "excecao".
+    Aqui o traceback vira texto em exc_text (exc_info não é serializável).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        mensagem = record.getMessage()
+        excecao = record.exc_text
+        if record.exc_info:
+            excecao = logging.Formatter().formatException(record.exc_info)
+
+        record = copy.copy(record)
+        record.message = mensagem
+        record.msg = mensagem
+        record.args = None
+        record.exc_info = None
+        record.exc_text = excecao
+        return record
+
+
+class FiltroCorrelacao(logging.Filter):
+    """
+    Anexa o correlation_id ao registro. Precisa rodar na thread de quem
+    loga (no QueueHandler), pois o contextvar não atravessa a fila.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar só uma fração dos registros DEBUG. A decisão é feita por
+    correlation_id, então uma requisição amostrada mantém todas as suas
+    linhas de tempo (e as demais não emitem nenhuma).
+    """
+
+    def __init__(self, taxa: float):
+        super().__init__()
+        self.taxa = max(0.0, min(1.0, taxa))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        cid = getattr(record, "correlation_id", "-")
+        if cid == "-":
+            return random.random() < self.taxa
+        return (zlib.crc32(cid.encode()) % 10000) < self.taxa * 10000
+
+
+def _criar_formatter() -> logging.Formatter:
+    if LOG_FORMATO == "texto":
+        return logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s"
+        )
+    return JsonFormatter()
+
+
+def configurar_logging(nome: str = "IPSEMG") -> logging.Logger:
+    """
+    Configura (uma vez só) o logger do IPSEMG com QueueHandler + QueueListener.
+    """
+    global _fila
+
+    logger = logging.getLogger(nome)
+    if logger.handlers:
+        return logger  # já configurado
+
+    logger.setLevel(logging.DEBUG if LOG_AMOSTRAGEM_DEBUG > 0 else logging.INFO)
+    logger.propagate = False
+
+    _fila = queue.SimpleQueue()
+    queue_handler = FilaHandler(_fila)
+    queue_handler.addFilter(FiltroCorrelacao())
+    if LOG_AMOSTRAGEM_DEBUG > 0:
+        queue_handler.addFilter(FiltroAmostragem(LOG_AMOSTRAGEM_DEBUG))
+    logger.addHandler(queue_handler)
+
+    iniciar_listener()
+    atexit.register(parar_logging)
+
+    return logger
+
+
+def iniciar_listener():
+    """
+    (Re)cria os handlers de saída e a thread que consome a fila.
+    Threads não sobrevivem ao fork: cada worker do gunicorn chama isto
+    no post_fork (veja gunicorn.conf.py).
+    """
+    global _listener
+    if _fila is None or _listener is not None:
+        return
+
+    formatter = _criar_formatter()
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+
+    file_handler = RotatingFileHandler(
+        LOG_ARQUIVO.format(pid=os.getpid()),
+        maxBytes=5 * 1024 * 1024,
+        backupCount=3,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(formatter)
+
+    _listener = QueueListener(_fila, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def parar_logging():
+    """
+    Esvazia a fila e encerra a thread do listener (e fecha os handlers).
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
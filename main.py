@@ -1,35 +1,59 @@
+# antes de tudo: mede o custo de import de cada módulo (relatório em /prontidao)
+import inicializacao
+inicializacao.medidor_imports.iniciar()
+
+from contextlib import asynccontextmanager
 from datetime import datetime
+from functools import lru_cache
+import asyncio
+import contextvars
+import functools
+import hmac
+import io
 import os
 import re
 import time
-import logging
-from logging.handlers import RotatingFileHandler
-from typing import List, Optional
-import nest_asyncio
-from fastapi import FastAPI, HTTPException
+from typing import TYPE_CHECKING, List, Optional
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel, validator
-import openpyxl
-from openpyxl.cell.cell import MergedCell
 import textwrap
 import unicodedata
-from fuzzywuzzy import fuzz
-from converte_em_pdf import gerar_pdf_final
+from converte_em_pdf import gerar_pdf_final_multiplo
+from log_ipsemg import configurar_logging, correlation_id
+import busca_cbhpm
+from busca_cbhpm import buscar_chbpm, carregar_dados_cbhpm_ipsemg, normalizar_texto
+from admissao import controle_guias
+import prazo_guia
+from prazo_guia import RenderInterrompido, guia_com_prazo, verificar_prazo
+from template_xlsx import TemplateXlsx
+from preview_guia import FORMATOS_PREVIEW, gerar_preview, obter_preview, preview_calibrado
+import perfil_ipsemg
+from perfil_ipsemg import perfilar
+from respostas_ipsemg import RespostaJson, configurar_compressao, link_assinado, link_valido, resposta_enxuta_pedida
 import uuid
 from pathlib import Path
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.middleware.cors import CORSMiddleware
-from openpyxl.drawing.image import Image as XLImage
+
+# openpyxl, PyMuPDF e fuzzywuzzy são importados no primeiro uso / no
+# aquecimento (inicializacao.py), não aqui: ficam fora do cold start
+if TYPE_CHECKING:
+    from openpyxl.drawing.image import Image as XLImage
 
 
-img = XLImage("logo_ipsemg.png")
-img.width = 130   # em pixels
-img.height = 52   # em pixels
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # não espera o aquecimento: a porta abre na hora e /prontidao diz
+    # quando cada subsistema ficou pronto
+    inicializacao.aquecer_em_segundo_plano()
+    yield
 
 
-nest_asyncio.apply()
-app = FastAPI()
+app = FastAPI(lifespan=ciclo_de_vida)
 
 # 🔓 CORS totalmente liberado (somente para desenvolvimento, mudar depois quando tiver dominio) DIMITRIUS MUDAR APOS PRODUCAO
 app.add_middleware(
@@ -39,41 +63,89 @@ app.add_middleware(
     allow_methods=["*"],          # Libera todos os métodos (GET, POST, DELETE, etc.)
     allow_headers=["*"],          # Libera todos os headers
 )
+
+# gzip/brotli acima de um tamanho mínimo (veja respostas_ipsemg.py); as
+# rotas que devolvem PDF ou imagem não são comprimidas
+COMPRESSAO_ATIVA = configurar_compressao(
+    app, rotas_binarias=(r"^/guias/[0-9a-f]+/pdf$", r"-saas$", r"-preview$")
+)
 VERSAO = "1.1 - 06/12/25"
 MODO_DEBUG = None
 
 IPSEMG_SADT = "IPSEMG_SADT.xlsx"
 IPSEMG_INTERNACAO = "IPSEMG_INTERNACAO.xlsx"
 
+# linhas de código/descrição/quantidade por guia; o que passar disso
+# vai para guias de continuação no mesmo PDF
+MAX_LINHAS_SADT = 7          # 46..52
+MAX_LINHAS_INTERNACAO = 10   # 29..38
+
+# "direto" (template_xlsx, sem openpyxl por requisição) ou "openpyxl"
+MOTOR_XLSX = os.getenv("IPSEMG_MOTOR_XLSX", "direto").strip().lower()
+
+
+LOGO_IPSEMG = "logo_ipsemg.png"
+
+# threads para preencher os XLSX das guias (fora do event loop). O openpyxl
+# segura o GIL, então threads não o fazem escalar entre núcleos: isso vem dos
+# workers do gunicorn (veja stress_preenchimento.py para medir)
+THREADS_PREENCHIMENTO = int(os.getenv("IPSEMG_THREADS_PREENCHIMENTO", os.cpu_count() or 1))
+POOL_PREENCHIMENTO = ThreadPoolExecutor(max_workers=THREADS_PREENCHIMENTO, thread_name_prefix="preenche")
 
-# Carregar arquivo IPSEMG TXT
-dados_ipsemg_normalizados = []
 
 # -----------------------------------------------
 # LOGGING
 # -----------------------------------------------
 
-logger = logging.getLogger("IPSEMG")
-logger.setLevel(logging.INFO)
+logger = configurar_logging("IPSEMG")
 
-formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
+async def perfilar_requisicao(request: Request, call_next):
+    """
+    Profiling opcional (veja perfil_ipsemg.py). Registrado antes do
+    correlacionar_requisicao para rodar por dentro dele, já com o
+    correlation_id definido.
+    """
+    if not perfil_ipsemg.deve_perfilar(request.headers):
+        return await call_next(request)
 
-file_handler = RotatingFileHandler(
-    "IPSEMG.log",
-    maxBytes=5 * 1024 * 1024,
-    backupCount=3,
-    encoding="utf-8",
-)
-file_handler.setFormatter(formatter)
+    sessao = perfil_ipsemg.iniciar_sessao(request.method, request.url.path, correlation_id.get())
+    if sessao is None:
+        # outra requisição já está sendo perfilada
+        response = await call_next(request)
+        response.headers[perfil_ipsemg.HEADER_PERFIL] = "ocupado"
+        return response
 
-if not logger.handlers:
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    try:
+        response = await call_next(request)
+    finally:
+        perfil_ipsemg.parar_sessao(sessao)
+        base = await asyncio.to_thread(perfil_ipsemg.finalizar_sessao, sessao)
+    if base is not None:
+        response.headers[perfil_ipsemg.HEADER_PERFIL] = base.name
+    return response
+
+
+# só com IPSEMG_PERFIL_HABILITADO: cada @app.middleware é mais uma camada
+# (task + stream) em toda requisição
+if perfil_ipsemg.PERFIL_HABILITADO:
+    app.middleware("http")(perfilar_requisicao)
+
+
+@app.middleware("http")
+async def correlacionar_requisicao(request: Request, call_next):
+    """
+    Define o correlation_id da requisição (reaproveita o X-Request-ID do
+    cliente, se vier) para que todas as linhas de log dela saiam marcadas.
+    """
+    cid = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = correlation_id.set(cid)
+    try:
+        response = await call_next(request)
+    finally:
+        correlation_id.reset(token)
+    response.headers["X-Request-ID"] = cid
+    return response
 
 # -----------------------------------------------
 # MODELOS
@@ -108,174 +180,14 @@ class IpsemgPayload(BaseModel):
     data: str
 
 
-def normalizar_texto(texto: str) -> str:
-    texto = texto.lower()
-
-    # Substituições médicas antes de remover acentos
-    substituicoes_medicas = {
-        "ressonância magnética": "rm",
-        "ressonancia magnetica": "rm",
-        "ressonancia": "rm",
-        "ressonância": "rm",
-        "tomografia computadorizada": "tc",
-        "tomografia": "tc",
-        "ultrassonografia": "us",
-        "ultrassom": "us",
-        "raio-x": "rx",
-        "eletrocardiograma": "ecg",
-    }
-    for chave, valor in substituicoes_medicas.items():
-        texto = texto.replace(chave, valor)
-
-    # Agora remove acentos
-    texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
-
-    # Substituir caracteres especiais por espaço
-    substituicoes = {
-        '–': ' ', '-': ' ', '—': ' ', '−': ' ',
-        ',': ' ', '.': ' ', ';': ' ', ':': ' ',
-        '(': ' ', ')': ' ', '[': ' ', ']': ' ',
-        '{': ' ', '}': ' ', '<': ' ', '>': ' ',
-        '!': ' ', '?': ' ', '"': ' ', "'": ' ',
-        '&': ' ', '@': ' ', '#': ' ', '$': ' ',
-        '%': ' ', '*': ' ', '+': ' ', '=': ' ',
-        '/': ' ', '\\': ' ', '|': ' '
-    }
-    for original, sub in substituicoes.items():
-        texto = texto.replace(original, sub)
-
-    # Remover espaços extras
-    texto = ' '.join(texto.split())
-
-    return texto
-
-def carregar_dados_cbhpm_ipsemg():
-    global dados_ipsemg_normalizados
-    if dados_ipsemg_normalizados:
-        return  # já carregado
-
-    try:
-        with open("ipsemg_refatorado.txt", encoding="utf-8") as f:
-            linhas = f.readlines()
-        for linha in linhas:
-            linha = linha.strip()
-            match = re.match(r'^(\d{1,2}\.\d{2}\.\d{2}\.\d{2}-\d)\s+(.*)', linha)
-            if match:
-                codigo = match.group(1)
-                descricao = match.group(2)
-                descricao_normalizada = normalizar_texto(descricao)
-                dados_ipsemg_normalizados.append({
-                    'normalizado': descricao_normalizada,
-                    'original': descricao,
-                    'codigo': codigo
-                })
-        logger.info(f"Arquivo CODIGOS IPSEMG TXT carregado com {len(dados_ipsemg_normalizados)} entradas")
-    except Exception as e:
-        logger.error(f"Erro ao carregar arquivo CODIGOS IPSEMG TXT: {str(e)}")
-
-# === Buscar CBHPM ===
-def buscar_chbpm(exame: str):
-    carregar_dados_cbhpm_ipsemg()
-    try:
-        tempo_inicio = time.time()
-        logger.info(f"=== INÍCIO DA BUSCA CODIGOS IPSEMG ===")
-        logger.info(f"Termo original: {exame}")
-
-        # Normalizar o texto de entrada
-        tempo_normalizacao = time.time()
-        exame = normalizar_texto(exame)
-        logger.info(f"Termo normalizado: {exame}")
-
-        # Busca por código CHBPM normalizado
-        tempo_busca_codigo = time.time()
-        exame_strip = exame.strip()
-        if re.fullmatch(r'\d{8}', exame_strip):
-            for dado in dados_ipsemg_normalizados:
-                codigo_normalizado = dado['codigo'].replace(".", "").replace("-", "")
-                if codigo_normalizado == exame_strip:
-                    logger.info(f"Tempo total: {time.time() - tempo_inicio:.4f}s")
-                    return {
-                        "consulta": exame,
-                        "sugestoes": [{
-                            "descricao": dado['original'],
-                            "codigo": dado['codigo'],
-                            "score": 100
-                        }]
-                    }
-        logger.info(f"Tempo busca por código: {time.time() - tempo_busca_codigo:.4f}s")
-
-        # Busca por expressão normalizada
-        tempo_preparacao = time.time()
-        stopwords = {"de", "do", "da", "e", "a", "o", "para", "por"}
-        termo_normalizado = ' '.join([
-            palavra for palavra in exame.split()
-            if palavra not in stopwords
-        ])
-
-        # Busca fuzzy otimizada
-        tempo_busca_fuzzy = time.time()
-        resultados = []
-        total_comparacoes = 0
-        if termo_normalizado.startswith("diaria"):
-            base_busca = [
-                dado for dado in dados_ipsemg_normalizados
-                if dado['normalizado'].startswith("diaria")
-            ]
-        else:
-            base_busca = [
-                dado for dado in dados_ipsemg_normalizados
-                if termo_normalizado in dado['normalizado']
-            ]
-
-            if not base_busca:
-                palavras = termo_normalizado.split()
-                base_busca = [
-                    dado for dado in dados_ipsemg_normalizados
-                    if all(p in dado['normalizado'] for p in palavras)
-                ]
-        for dado in base_busca:
-            total_comparacoes += 1
-            score = int(fuzz.WRatio(termo_normalizado, dado['normalizado']))
-            if score >= 70 or termo_normalizado in dado['normalizado']:
-                resultados.append({
-                    'descricao': dado['original'],
-                    'codigo': dado['codigo'],
-                    'score': score
-                })
-
-        # Ordenar resultados
-        tempo_ordenacao = time.time()
-        palavras_busca = set(termo_normalizado.split())
-
-        def contem_todas_as_palavras(descricao):
-            return palavras_busca.issubset(set(normalizar_texto(descricao).split()))
-
-        resultados.sort(key=lambda x: (
-            not contem_todas_as_palavras(x['descricao']),  # True vira 1, False vira 0 (queremos False primeiro)
-            not x['descricao'].lower().startswith(termo_normalizado),
-            -x['score']
-        ))
-
-        # Limitar a 20 resultados
-        resultados = resultados[:5]
-        logger.info(f"Total de resultados encontrados: {len(resultados)}")
-        logger.info(f"Tempo total: {time.time() - tempo_inicio:.4f}s")
-        logger.info("=== FIM DA BUSCA CBHPM ===")
-
-        return {
-            "consulta": exame,
-            "sugestoes": resultados
-        }
-
-    except Exception as e:
-        logger.info(f"Erro na busca CBHPM: {str(e)}", exc_info=True)
-        return {"consulta": exame, "sugestoes": [], "erro": str(e)}
-
-
 # === FastAPI Schemas ===
 class CBHPMRequest(BaseModel):
     exame: str
 
+class CBHPMLoteRequest(BaseModel):
+    exames: List[str]
+    limite: int = 5
+
 
 # === Endpoint: Buscar CBHPM ===
 @app.post("/buscar-chbpm")
@@ -284,7 +196,8 @@ async def buscar_chbpm_endpoint(request: CBHPMRequest):
         resultado = buscar_chbpm(request.exame)
         if isinstance(resultado, JSONResponse):
             return resultado
-        return resultado
+        # direto como Response: pula o jsonable_encoder e serializa com orjson
+        return RespostaJson(resultado)
     except Exception as e:
         logger.info(f"Erro ao buscar CODIGO IPSEMG: {str(e)}")
         return JSONResponse(
@@ -292,6 +205,23 @@ async def buscar_chbpm_endpoint(request: CBHPMRequest):
             content={"mensagem": f"Erro ao buscar CODIGO IPSEMG: {str(e)}"}
         )
 
+MAX_LOTE_BUSCA = int(os.getenv("IPSEMG_MAX_LOTE_BUSCA", "500"))
+
+@app.post("/buscar-chbpm-lote")
+async def buscar_chbpm_lote_endpoint(request: CBHPMLoteRequest):
+    """
+    Várias buscas numa requisição só; resultados na ordem dos exames.
+    """
+    if len(request.exames) > MAX_LOTE_BUSCA:
+        raise HTTPException(status_code=413, detail=f"Máximo de {MAX_LOTE_BUSCA} exames por lote")
+    limite = max(1, min(request.limite, 50))
+
+    # ~1ms por busca: um lote grande fora do event loop
+    resultados = await asyncio.to_thread(
+        perfilar(lambda: [buscar_chbpm(exame, limite=limite) for exame in request.exames])
+    )
+    return RespostaJson({"resultados": resultados})
+
 def remover_acentos(texto):
     return unicodedata.normalize('NFD', texto).encode('ascii', 'ignore').decode('utf-8')
 
@@ -315,12 +245,39 @@ def sanitize_filename_part(text: str) -> str:
 
     return text_clean or "Paciente"
 
+@lru_cache(maxsize=None)
+def _logo_ipsemg_bytes() -> bytes:
+    """
+    PNG do logo lido e validado uma vez só; bytes são imutáveis, então
+    podem ser compartilhados entre threads.
+    """
+    from PIL import Image as PILImage
+
+    dados = Path(LOGO_IPSEMG).read_bytes()
+    PILImage.open(io.BytesIO(dados)).verify()
+    return dados
+
+
+def nova_logo_ipsemg() -> "XLImage":
+    """
+    XLImage novo a cada workbook: o openpyxl lê o stream da imagem no save,
+    então o mesmo objeto em dois workbooks (em threads diferentes) disputaria
+    o seek/read.
+    """
+    from openpyxl.drawing.image import Image as XLImage
+
+    logo = XLImage(io.BytesIO(_logo_ipsemg_bytes()))
+    logo.width = 130   # em pixels
+    logo.height = 52   # em pixels
+    return logo
+
+
 def aplicar_logo_ipsemg(ws, cell="A1"):
     """
     Adiciona o logo do IPSEMG na planilha na célula indicada.
     """
     try:
-        ws.add_image(img, "B1")
+        ws.add_image(nova_logo_ipsemg(), "B1")
     except Exception as e:
         logger.error(f"Erro ao adicionar logo IPSEMG: {e}")
 
@@ -329,6 +286,8 @@ def set_cell_value_safely(ws, coord: str, value):
     Se a célula for parte de um merged range, grava na célula
     superior esquerda do merge. Se não for, grava direto.
     """
+    from openpyxl.cell.cell import MergedCell
+
     cell = ws[coord]
 
     if not isinstance(cell, MergedCell):
@@ -345,54 +304,152 @@ def set_cell_value_safely(ws, coord: str, value):
     raise ValueError(f"Célula {coord} é mesclada mas o range não foi encontrado.")
 
 
-async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
-    if not os.path.exists(IPSEMG_SADT):
-        raise HTTPException(status_code=500, detail=f"Arquivo {IPSEMG_SADT} não encontrado")
+def preencher_xlsx_openpyxl(template: str, campos: dict, destino) -> None:
+    """
+    Caminho clássico: carrega o template no openpyxl, grava os campos,
+    adiciona o logo e salva.
+    """
+    import openpyxl
 
-    # ----- diretório isolado por requisição (se já estiver assim na sua rota atual, mantenha) -----
-    request_id = uuid.uuid4().hex
-    base_dir = Path("/tmp") / request_id
-    base_dir.mkdir(parents=True, exist_ok=True)
+    wb = openpyxl.load_workbook(template)
+    ws = wb.active  # primeira aba
 
-    # caminhos exclusivos dessa requisição
-    xlsx_path = base_dir / "ipsemg_sadt_output.xlsx"
-    logger.info(f"[DEBUG] XLSX gerado em: {xlsx_path}")
+    for coord, valor in campos.items():
+        set_cell_value_safely(ws, coord, valor)
 
+    aplicar_logo_ipsemg(ws, cell="A1")
+    wb.save(destino)
+
+
+_templates_xlsx = {}
+_templates_lock = threading.Lock()
+
+
+def _template_xlsx(template: str) -> TemplateXlsx:
+    """
+    Template pré-processado para o motor direto. A base é o próprio template
+    salvo uma vez pelo openpyxl já com o logo, então o XLSX gerado pelo motor
+    direto só difere do caminho openpyxl nas células preenchidas.
+    Depois de pronto o TemplateXlsx é só leitura e pode ser usado por várias
+    threads ao mesmo tempo.
+    """
+    pronto = _templates_xlsx.get(template)
+    if pronto is not None:
+        return pronto
+
+    with _templates_lock:
+        pronto = _templates_xlsx.get(template)
+        if pronto is None:
+            import openpyxl
+
+            wb = openpyxl.load_workbook(template)
+            aplicar_logo_ipsemg(wb.active, cell="A1")
+            buffer = io.BytesIO()
+            wb.save(buffer)
+            pronto = TemplateXlsx(buffer.getvalue())
+            _templates_xlsx[template] = pronto
+        return pronto
+
+
+def preencher_xlsx(template: str, campos: dict, destino) -> None:
+    """
+    Preenche o template com {coordenada: valor} e grava em `destino`.
+    Usa o motor direto (template_xlsx) e cai para o openpyxl se ele falhar
+    ou se MOTOR_XLSX = "openpyxl".
+    """
+    if MOTOR_XLSX == "direto":
+        try:
+            _template_xlsx(template).preencher(campos, destino)
+            return
+        except Exception as e:
+            logger.error(f"Erro no motor XLSX direto ({template}), usando openpyxl: {e}")
+
+    preencher_xlsx_openpyxl(template, campos, destino)
+
+
+def _paginar_payload(payload: IpsemgPayload, max_linhas: int) -> List[IpsemgPayload]:
+    """
+    Divide códigos/descrições/quantidades em páginas de `max_linhas`.
+    Cada página é uma guia completa (os demais campos se repetem).
+    """
+    codigos = payload.codigos or []
+    descricoes = payload.descricao or []
+    quantidades = payload.quantidades or []
+
+    total = max(len(codigos), len(descricoes), len(quantidades))
+    if total <= max_linhas:
+        return [payload]
+
+    paginas = []
+    for inicio in range(0, total, max_linhas):
+        fatia = slice(inicio, inicio + max_linhas)
+        paginas.append(payload.model_copy(update={
+            "codigos": codigos[fatia],
+            "descricao": descricoes[fatia],
+            "quantidades": quantidades[fatia],
+        }))
+    return paginas
+
+
+@perfilar
+def _preencher_paginas(template: str, paginas: list, montar_campos, xlsx_path: Path) -> List[Path]:
+    """
+    Gera um XLSX por página: <nome>.xlsx, <nome>_p2.xlsx, <nome>_p3.xlsx...
+    """
+    xlsx_paths = []
+    for numero, pagina in enumerate(paginas, start=1):
+        verificar_prazo("preenchimento")
+        destino = xlsx_path if numero == 1 else xlsx_path.with_name(f"{xlsx_path.stem}_p{numero}.xlsx")
+        preencher_xlsx(template, montar_campos(pagina), destino)
+        xlsx_paths.append(destino)
+    return xlsx_paths
 
-    # carrega template
-    wb = openpyxl.load_workbook(IPSEMG_SADT)
-    ws = wb.active  # primeira aba
+
+async def _rodar_no_pool(func, *args):
+    """
+    Roda `func` no POOL_PREENCHIMENTO levando junto o contexto (correlation_id).
+    """
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(POOL_PREENCHIMENTO, functools.partial(ctx.run, func, *args))
+
+
+def _campos_ipsemg_sadt(payload: IpsemgPayload) -> dict:
+    """
+    Monta {coordenada: valor} da guia SADT a partir do payload.
+    """
+    campos = {}
 
     # -------------------------------------------------
     # CAMPOS SIMPLES
     # -------------------------------------------------
 
     # nome_beneficiario -> B7
-    set_cell_value_safely(ws, "B7", payload.nome_beneficiario)
+    campos["B7"] = payload.nome_beneficiario
 
     # solicitante -> B13
-    set_cell_value_safely(ws, "B13", payload.solicitante)
+    campos["B13"] = payload.solicitante
 
     # prestador -> B10
-    set_cell_value_safely(ws, "B10", payload.prestador)
+    campos["B10"] = payload.prestador
 
     # matricula -> W10
-    set_cell_value_safely(ws, "W10", payload.matricula)
+    campos["W10"] = payload.matricula
 
     # uf -> B16
-    set_cell_value_safely(ws, "B16", payload.uf)
+    campos["B16"] = payload.uf
 
     # crm -> Z13
-    set_cell_value_safely(ws, "Z13", payload.crm)
+    campos["Z13"] = payload.crm
 
     # especialidade -> G16
-    set_cell_value_safely(ws, "G16", payload.especialidade)
+    campos["G16"] = payload.especialidade
 
     # cid -> Z20
-    set_cell_value_safely(ws, "Z20", payload.cid)
+    campos["Z20"] = payload.cid
 
     # assinatura -> J63
-    set_cell_value_safely(ws, "J63", payload.assinatura)
+    campos["J63"] = payload.assinatura
 
     # data "dd/mm/aaaa" -> C63 (dia), E63 (mes), G63 (ano)
     dia, mes, ano = "", "", ""
@@ -403,9 +460,9 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
     except Exception:
         pass
 
-    set_cell_value_safely(ws, "C63", dia)
-    set_cell_value_safely(ws, "E63", mes)
-    set_cell_value_safely(ws, "G63", ano)
+    campos["C63"] = dia
+    campos["E63"] = mes
+    campos["G63"] = ano
 
     # -------------------------------------------------
     # CARÁTER (ELETIVO / URGÊNCIA)
@@ -414,13 +471,13 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
     car = (payload.carater or "").strip().lower()
 
     # Limpamos os dois primeiro
-    set_cell_value_safely(ws, "C20", "")
-    set_cell_value_safely(ws, "I20", "")
+    campos["C20"] = ""
+    campos["I20"] = ""
 
     if "elet" in car:
-        set_cell_value_safely(ws, "C20", "X")
+        campos["C20"] = "X"
     elif "urg" in car or "úrg" in car:
-        set_cell_value_safely(ws, "I20", "X")
+        campos["I20"] = "X"
 
     # -------------------------------------------------
     # INDICAÇÃO CLÍNICA -> C23 a C27 (com quebra em linhas)
@@ -430,7 +487,7 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
         texto_linha = linhas_indicacao[i] if i < len(linhas_indicacao) else ""
         row = 23 + i
         coord = f"C{row}"
-        set_cell_value_safely(ws, coord, texto_linha)
+        campos[coord] = texto_linha
 
     # -------------------------------------------------
     # TRATAMENTOS REALIZADOS -> C30 a C34 (mesma regra)
@@ -440,7 +497,7 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
         texto_linha = linhas_trat[i] if i < len(linhas_trat) else ""
         row = 30 + i
         coord = f"C{row}"
-        set_cell_value_safely(ws, coord, texto_linha)
+        campos[coord] = texto_linha
 
     # -------------------------------------------------
     # HIPÓTESE DIAGNÓSTICA -> C37 a C41 (mesma regra)
@@ -450,7 +507,7 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
         texto_linha = linhas_hipotese[i] if i < len(linhas_hipotese) else ""
         row = 37 + i
         coord = f"C{row}"
-        set_cell_value_safely(ws, coord, texto_linha)
+        campos[coord] = texto_linha
 
     # -------------------------------------------------
     # CÓDIGOS / DESCRIÇÃO / QUANTIDADES
@@ -458,7 +515,7 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
     # DESCRIÇÃO -> G46 a G52
     # QUANTIDADES -> AE46 a AE52
     # -------------------------------------------------
-    max_linhas = 7  # 46..52 = 7 linhas
+    max_linhas = MAX_LINHAS_SADT  # 46..52 = 7 linhas
 
     codigos = payload.codigos or []
     quantidades = payload.quantidades or []
@@ -471,81 +528,109 @@ async def _ipsemg_sadt_core(payload: IpsemgPayload) -> dict:
         desc_coord = f"G{row}"
         qtd_coord = f"AE{row}"
 
-        set_cell_value_safely(ws, cod_coord, codigos[idx] if idx < len(codigos) else "")
-        set_cell_value_safely(ws, desc_coord, descricoes[idx] if idx < len(descricoes) else "")
-        set_cell_value_safely(ws, qtd_coord, quantidades[idx] if idx < len(quantidades) else "")
+        campos[cod_coord] = codigos[idx] if idx < len(codigos) else ""
+        campos[desc_coord] = descricoes[idx] if idx < len(descricoes) else ""
+        campos[qtd_coord] = quantidades[idx] if idx < len(quantidades) else ""
 
-    # salva o XLSX desta requisição
-    aplicar_logo_ipsemg(ws, cell="A1")
-    wb.save(xlsx_path)
+    return campos
 
-    try:
-        pdf_file = gerar_pdf_final(str(xlsx_path))
-    except Exception as e:
-        pdf_file = None
-        print(f"Erro ao converter para PDF: {e}")
+
+async def _ipsemg_sadt_core(payload: IpsemgPayload, request: Optional[Request] = None) -> dict:
+    if not os.path.exists(IPSEMG_SADT):
+        raise HTTPException(status_code=500, detail=f"Arquivo {IPSEMG_SADT} não encontrado")
+
+    # ----- diretório isolado por requisição (se já estiver assim na sua rota atual, mantenha) -----
+    request_id = uuid.uuid4().hex
+    base_dir = Path("/tmp") / request_id
+    base_dir.mkdir(parents=True, exist_ok=True)
+
+    # caminhos exclusivos dessa requisição
+    xlsx_path = base_dir / "ipsemg_sadt_output.xlsx"
+    logger.debug("XLSX gerado em: %s", xlsx_path)
+
+    # preenche o template e salva o(s) XLSX desta requisição (1 por página)
+    paginas = _paginar_payload(payload, MAX_LINHAS_SADT)
+    # vaga de admissão + prazo de ponta a ponta + cancelamento se o cliente
+    # desconectar, inclusive enquanto espera na fila (prazo_guia.py)
+    async with guia_com_prazo(request, admissao=controle_guias):
+        xlsx_paths = await _rodar_no_pool(_preencher_paginas, IPSEMG_SADT, paginas, _campos_ipsemg_sadt, xlsx_path)
+
+        try:
+            # soffice + PyMuPDF fora do event loop (a vaga de admissão limita quantos rodam juntos)
+            pdf_file = await asyncio.to_thread(perfilar(gerar_pdf_final_multiplo), [str(p) for p in xlsx_paths])
+        except RenderInterrompido:
+            raise
+        except Exception as e:
+            pdf_file = None
+            logger.error(f"Erro ao converter para PDF: {e}")
 
     return {
         "status": "ok",
         "mensagem": "GUIA IPSEMG SADT preenchida com sucesso",
         "arquivo_xlsx": str(xlsx_path),
+        "arquivos_xlsx": [str(p) for p in xlsx_paths],
+        "paginas": len(xlsx_paths),
         "arquivo_pdf": pdf_file,
+        "guia_id": request_id,
         "payload": payload.model_dump()
     }
 
+def _resposta_enxuta(result: dict) -> RespostaJson:
+    """
+    Só status + id da guia + link assinado para baixar o PDF (sem ecoar o
+    payload nem caminhos do servidor).
+    """
+    guia_id = result["guia_id"]
+    return RespostaJson({
+        "status": result["status"],
+        "guia_id": guia_id,
+        "paginas": result["paginas"],
+        "url_pdf": link_assinado(f"/guias/{guia_id}/pdf", guia_id) if result["arquivo_pdf"] else None,
+    })
+
+# ?resposta=enxuta ou "Prefer: return=minimal" para a resposta enxuta
 @app.post("/ipsemg-sadt")
-async def ipsemg_sadt(payload: IpsemgPayload):
-    return await _ipsemg_sadt_core(payload)
+async def ipsemg_sadt(payload: IpsemgPayload, request: Request, resposta: Optional[str] = None):
+    result = await _ipsemg_sadt_core(payload, request)
+    return _resposta_enxuta(result) if resposta_enxuta_pedida(request, resposta) else result
 
-async def _ipsemg_internacao_core(payload: IpsemgPayload) -> dict:
-    if not os.path.exists(IPSEMG_INTERNACAO):
-        raise HTTPException(
-            status_code=500,
-            detail=f"Arquivo {IPSEMG_INTERNACAO} não encontrado"
-        )
-
-    # ----- diretório isolado por requisição -----
-    request_id = uuid.uuid4().hex
-    base_dir = Path("/tmp") / request_id
-    base_dir.mkdir(parents=True, exist_ok=True)
-
-    xlsx_path = base_dir / "ipsemg_internacao_output.xlsx"
-    logger.info(f"[DEBUG] XLSX gerado em: {xlsx_path}")
-
-    wb = openpyxl.load_workbook(IPSEMG_INTERNACAO)
-    ws = wb.active  # primeira aba
+def _campos_ipsemg_internacao(payload: IpsemgPayload) -> dict:
+    """
+    Monta {coordenada: valor} da guia de internação a partir do payload.
+    """
+    campos = {}
 
     # -------------------------------------------------
     # CARÁTER (ELETIVO / URGÊNCIA)
     # -------------------------------------------------
     car = (payload.carater or "").strip().lower()
 
-    set_cell_value_safely(ws, "E9", "")
-    set_cell_value_safely(ws, "R9", "")
+    campos["E9"] = ""
+    campos["R9"] = ""
 
     if "elet" in car:
-        set_cell_value_safely(ws, "E9", "X")
+        campos["E9"] = "X"
     elif "urg" in car or "úrg" in car:
-        set_cell_value_safely(ws, "R9", "X")
+        campos["R9"] = "X"
 
     # -------------------------------------------------
     # CAMPOS SIMPLES
     # -------------------------------------------------
-    set_cell_value_safely(ws, "B13", payload.matricula)      # matrícula
-    set_cell_value_safely(ws, "H13", payload.prestador)      # prestador
+    campos["B13"] = payload.matricula      # matrícula
+    campos["H13"] = payload.prestador      # prestador
 
     sexo = (payload.sexo or "").strip().lower()
 
-    set_cell_value_safely(ws, "U17", "")
-    set_cell_value_safely(ws, "AB17", "")
+    campos["U17"] = ""
+    campos["AB17"] = ""
 
     if "masc" in sexo:
-        set_cell_value_safely(ws, "U17", "X")
+        campos["U17"] = "X"
     elif "fem" in sexo:
-        set_cell_value_safely(ws, "AB17", "X")
+        campos["AB17"] = "X"
 
     # nome beneficiário -> B20
-    set_cell_value_safely(ws, "B20", payload.nome_beneficiario)
+    campos["B20"] = payload.nome_beneficiario
 
     # -------------------------------------------------
     # DATA NASCIMENTO BENEFICIÁRIO (dd/mm/aaaa)
@@ -559,14 +644,14 @@ async def _ipsemg_internacao_core(payload: IpsemgPayload) -> dict:
     except Exception:
         pass
 
-    set_cell_value_safely(ws, "L17", dia_nasc)
-    set_cell_value_safely(ws, "N17", mes_nasc)
-    set_cell_value_safely(ws, "P17", ano_nasc)
+    campos["L17"] = dia_nasc
+    campos["N17"] = mes_nasc
+    campos["P17"] = ano_nasc
 
     # -------------------------------------------------
     # CÓDIGOS / DESCRIÇÕES / QUANTIDADES
     # -------------------------------------------------
-    max_linhas = 10  # 29..38
+    max_linhas = MAX_LINHAS_INTERNACAO  # 29..38
 
     codigos = payload.codigos or []
     descricoes = getattr(payload, "descricoes", None) or getattr(payload, "descricao", None) or []
@@ -579,14 +664,14 @@ async def _ipsemg_internacao_core(payload: IpsemgPayload) -> dict:
         desc_coord = f"G{row}"
         qtd_coord  = f"AG{row}"
 
-        set_cell_value_safely(ws, cod_coord, codigos[idx]      if idx < len(codigos)      else "")
-        set_cell_value_safely(ws, desc_coord, descricoes[idx]  if idx < len(descricoes)   else "")
-        set_cell_value_safely(ws, qtd_coord,  quantidades[idx] if idx < len(quantidades)  else "")
+        campos[cod_coord] = codigos[idx]      if idx < len(codigos)      else ""
+        campos[desc_coord] = descricoes[idx]  if idx < len(descricoes)   else ""
+        campos[qtd_coord] =  quantidades[idx] if idx < len(quantidades)  else ""
 
     # -------------------------------------------------
     # INDICAÇÃO CLÍNICA -> B53
     # -------------------------------------------------
-    set_cell_value_safely(ws, "B53", payload.indicacao_clinica)
+    campos["B53"] = payload.indicacao_clinica
 
     # -------------------------------------------------
     # HIPÓTESE + CID -> B59
@@ -601,14 +686,14 @@ async def _ipsemg_internacao_core(payload: IpsemgPayload) -> dict:
     else:
         texto_hipotese = cid
 
-    set_cell_value_safely(ws, "B59", texto_hipotese)
+    campos["B59"] = texto_hipotese
 
     # -------------------------------------------------
     # SOLICITANTE / CRM / ESPECIALIDADE
     # -------------------------------------------------
-    set_cell_value_safely(ws, "B62", payload.solicitante)
-    set_cell_value_safely(ws, "B64", payload.crm)
-    set_cell_value_safely(ws, "I64", payload.especialidade)
+    campos["B62"] = payload.solicitante
+    campos["B64"] = payload.crm
+    campos["I64"] = payload.especialidade
 
     # -------------------------------------------------
     # DATA DA GUIA (dd/mm/aaaa) -> AB64, AD64, AF64
@@ -622,41 +707,88 @@ async def _ipsemg_internacao_core(payload: IpsemgPayload) -> dict:
     except Exception:
         pass
 
-    set_cell_value_safely(ws, "AB64", dia)
-    set_cell_value_safely(ws, "AD64", mes)
-    set_cell_value_safely(ws, "AF64", ano)
+    campos["AB64"] = dia
+    campos["AD64"] = mes
+    campos["AF64"] = ano
 
     # assinatura -> C67
-    set_cell_value_safely(ws, "C67", payload.assinatura)
+    campos["C67"] = payload.assinatura
 
-    aplicar_logo_ipsemg(ws, cell="A1")
-    # salva o XLSX desta requisição
-    wb.save(xlsx_path)
+    return campos
 
-    try:
-        pdf_file = gerar_pdf_final(str(xlsx_path))
-    except Exception as e:
-        pdf_file = None
-        print(f"Erro ao converter para PDF: {e}")
+
+async def _ipsemg_internacao_core(payload: IpsemgPayload, request: Optional[Request] = None) -> dict:
+    if not os.path.exists(IPSEMG_INTERNACAO):
+        raise HTTPException(
+            status_code=500,
+            detail=f"Arquivo {IPSEMG_INTERNACAO} não encontrado"
+        )
+
+    # ----- diretório isolado por requisição -----
+    request_id = uuid.uuid4().hex
+    base_dir = Path("/tmp") / request_id
+    base_dir.mkdir(parents=True, exist_ok=True)
+
+    xlsx_path = base_dir / "ipsemg_internacao_output.xlsx"
+    logger.debug("XLSX gerado em: %s", xlsx_path)
+
+    # preenche o template e salva o(s) XLSX desta requisição (1 por página)
+    paginas = _paginar_payload(payload, MAX_LINHAS_INTERNACAO)
+    # vaga de admissão + prazo de ponta a ponta + cancelamento se o cliente
+    # desconectar, inclusive enquanto espera na fila (prazo_guia.py)
+    async with guia_com_prazo(request, admissao=controle_guias):
+        xlsx_paths = await _rodar_no_pool(_preencher_paginas, IPSEMG_INTERNACAO, paginas, _campos_ipsemg_internacao, xlsx_path)
+
+        try:
+            # soffice + PyMuPDF fora do event loop (a vaga de admissão limita quantos rodam juntos)
+            pdf_file = await asyncio.to_thread(perfilar(gerar_pdf_final_multiplo), [str(p) for p in xlsx_paths])
+        except RenderInterrompido:
+            raise
+        except Exception as e:
+            pdf_file = None
+            logger.error(f"Erro ao converter para PDF: {e}")
 
     return {
         "status": "ok",
         "mensagem": "GUIA IPSEMG INTERNACAO preenchida com sucesso",
         "arquivo_xlsx": str(xlsx_path),
+        "arquivos_xlsx": [str(p) for p in xlsx_paths],
+        "paginas": len(xlsx_paths),
         "arquivo_pdf": pdf_file,
+        "guia_id": request_id,
         "payload": payload.model_dump()
     }
 
 
 # Endpoint JSON (mantém compatibilidade com o que já existe)
 @app.post("/ipsemg-internacao")
-async def ipsemg_internacao(payload: IpsemgPayload):
-    return await _ipsemg_internacao_core(payload)
+async def ipsemg_internacao(payload: IpsemgPayload, request: Request, resposta: Optional[str] = None):
+    result = await _ipsemg_internacao_core(payload, request)
+    return _resposta_enxuta(result) if resposta_enxuta_pedida(request, resposta) else result
+
+@app.get("/guias/{guia_id}/pdf")
+async def baixar_guia(guia_id: str, expira: Optional[int] = None, assinatura: Optional[str] = None):
+    """
+    PDF final de uma guia já gerada, pelo url_pdf da resposta enxuta (link
+    assinado e com validade: o PDF tem dados do paciente).
+
+    O PDF fica no /tmp local da instância que gerou a guia. Com mais de uma
+    instância (Cloud Run escalando), o link só funciona com afinidade de
+    sessão; sem isso, use a resposta completa ou as rotas *-saas.
+    """
+    if not link_valido(guia_id, expira, assinatura):
+        raise HTTPException(status_code=403, detail="Link inválido ou expirado")
+    if not re.fullmatch(r"[0-9a-f]{32}", guia_id):
+        raise HTTPException(status_code=404, detail="Guia não encontrada")
+    pdfs = sorted((Path("/tmp") / guia_id).glob("*_final.pdf"))
+    if not pdfs:
+        raise HTTPException(status_code=404, detail="Guia não encontrada")
+    return FileResponse(path=pdfs[0], media_type="application/pdf", filename=f"guia_{guia_id}.pdf")
 
 @app.post("/ipsemg-sadt-saas")
-async def ipsemg_sadt_saas(payload: IpsemgPayload):
+async def ipsemg_sadt_saas(payload: IpsemgPayload, request: Request):
     # Reusa a MESMA lógica que já sabemos que funciona
-    result = await _ipsemg_sadt_core(payload)
+    result = await _ipsemg_sadt_core(payload, request)
 
     pdf_path = result.get("arquivo_pdf")
     if not pdf_path or not Path(pdf_path).exists():
@@ -668,7 +800,6 @@ async def ipsemg_sadt_saas(payload: IpsemgPayload):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     filename = f"Sgu_Express_{nome_benef}_IPSEMG_SADT_{timestamp}.pdf"
-    print(filename)
 
     return FileResponse(
         path=pdf_path,
@@ -677,9 +808,9 @@ async def ipsemg_sadt_saas(payload: IpsemgPayload):
     )
 
 @app.post("/ipsemg-internacao-saas")
-async def ipsemg_internacao_saas(payload: IpsemgPayload):
+async def ipsemg_internacao_saas(payload: IpsemgPayload, request: Request):
     # Reusa a MESMA lógica que já sabemos que funciona
-    result = await _ipsemg_internacao_core(payload)
+    result = await _ipsemg_internacao_core(payload, request)
 
     pdf_path = result.get("arquivo_pdf")
     if not pdf_path or not Path(pdf_path).exists():
@@ -694,7 +825,6 @@ async def ipsemg_internacao_saas(payload: IpsemgPayload):
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
     filename = f"Sgu_Express_{nome_benef}_IPSEMG_INTERNACAO_{timestamp}.pdf"
-    print(filename)
 
     return FileResponse(
         path=pdf_path,
@@ -702,11 +832,128 @@ async def ipsemg_internacao_saas(payload: IpsemgPayload):
         filename=filename
     )
 
+async def _preview_guia(template: str, campos: dict, formato: str, request: Optional[Request] = None) -> Response:
+    formato = (formato or "png").strip().lower()
+    if formato not in FORMATOS_PREVIEW:
+        raise HTTPException(status_code=400, detail=f"Formato de preview inválido: {formato}")
+    if not os.path.exists(template):
+        raise HTTPException(status_code=500, detail=f"Arquivo {template} não encontrado")
+
+    try:
+        if not preview_calibrado(template):
+            # a calibração roda o soffice: passa pela admissão e pelo prazo como uma guia
+            async with guia_com_prazo(request, admissao=controle_guias):
+                await asyncio.to_thread(
+                    perfilar(lambda: obter_preview(template, _template_xlsx(template), campos.keys()))
+                )
+        imagem = await asyncio.to_thread(
+            perfilar(lambda: gerar_preview(template, _template_xlsx(template), campos, formato))
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro ao gerar preview ({template}): {e}")
+        raise HTTPException(status_code=500, detail="Erro ao gerar preview da guia")
+
+    return Response(content=imagem, media_type=FORMATOS_PREVIEW[formato])
+
+# Preview em baixa resolução (só a primeira página); o PDF final sai nas rotas acima
+@app.post("/ipsemg-sadt-preview")
+async def ipsemg_sadt_preview(payload: IpsemgPayload, request: Request, formato: str = "png"):
+    pagina = _paginar_payload(payload, MAX_LINHAS_SADT)[0]
+    return await _preview_guia(IPSEMG_SADT, _campos_ipsemg_sadt(pagina), formato, request)
+
+@app.post("/ipsemg-internacao-preview")
+async def ipsemg_internacao_preview(payload: IpsemgPayload, request: Request, formato: str = "png"):
+    pagina = _paginar_payload(payload, MAX_LINHAS_INTERNACAO)[0]
+    return await _preview_guia(IPSEMG_INTERNACAO, _campos_ipsemg_internacao(pagina), formato, request)
+
+# -----------------------------------------------
+# AQUECIMENTO / PRONTIDÃO
+# -----------------------------------------------
+
+def _aquecer_catalogo():
+    inicializacao.importar("fuzzywuzzy.fuzz")
+    carregar_dados_cbhpm_ipsemg()
+    if not busca_cbhpm.dados_ipsemg_normalizados:
+        raise RuntimeError("catálogo IPSEMG vazio (veja o log do carregamento)")
+
+def _aquecer_templates():
+    inicializacao.importar("openpyxl")
+    _logo_ipsemg_bytes()
+    for template in (IPSEMG_SADT, IPSEMG_INTERNACAO):
+        if os.path.exists(template):
+            _template_xlsx(template)
+
+def _aquecer_pdf():
+    inicializacao.importar("fitz")
+
+inicializacao.registrar_subsistema("catalogo", _aquecer_catalogo)
+inicializacao.registrar_subsistema("templates", _aquecer_templates)
+inicializacao.registrar_subsistema("pdf", _aquecer_pdf)
+
+def pre_carregar():
+    """
+    Aquece tudo de uma vez, na thread corrente. No modo produção
+    (gunicorn.conf.py) roda no processo pai antes do fork, e os workers
+    herdam catálogo, logo e templates por copy-on-write.
+    """
+    inicio = time.time()
+    inicializacao.aquecer()
+    logger.info(f"Pré-carregamento concluído em {time.time() - inicio:.2f}s")
+
+@app.get("/prontidao")
+async def prontidao():
+    """
+    200 quando todos os subsistemas estão aquecidos, 503 antes disso
+    (para startup/readiness probe). Traz o relatório de inicialização.
+    """
+    estado = inicializacao.relatorio()
+    return JSONResponse(status_code=200 if estado["pronto"] else 503, content=estado)
+
+@app.get("/metricas")
+async def metricas():
+    return {"guias": controle_guias.metricas(), "prazos": prazo_guia.metricas()}
+
+# -----------------------------------------------
+# ADMIN: PERFIS DE REQUISIÇÃO
+# -----------------------------------------------
+
+ADMIN_TOKEN = os.getenv("IPSEMG_ADMIN_TOKEN", "")
+
+def _verificar_admin(request: Request):
+    # sem IPSEMG_ADMIN_TOKEN configurado as rotas de admin nem existem
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get("X-Admin-Token")
+    if not token or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Token de admin inválido")
+
+@app.get("/admin/perfis")
+async def listar_perfis(request: Request):
+    _verificar_admin(request)
+    return {
+        "habilitado": perfil_ipsemg.PERFIL_HABILITADO,
+        "amostragem": perfil_ipsemg.PERFIL_AMOSTRAGEM,
+        "perfis": perfil_ipsemg.listar_perfis(),
+    }
+
+@app.get("/admin/perfis/{arquivo}")
+async def baixar_perfil(arquivo: str, request: Request):
+    _verificar_admin(request)
+    caminho = perfil_ipsemg.caminho_perfil(arquivo)
+    if caminho is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    media_type = "text/plain; charset=utf-8" if caminho.suffix == ".txt" else "application/octet-stream"
+    return FileResponse(path=caminho, media_type=media_type, filename=caminho.name)
+
 @app.get("/versao", response_model=VersaoResponse)
 async def versao():
     logger.info("Endpoint /versao chamado")
     return {"versao": VERSAO}
 
+inicializacao.medidor_imports.parar()
+
 # -----------------------------------------------
 # RODAR LOCALMENTE / CLOUD RUN
 # -----------------------------------------------
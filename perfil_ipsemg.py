@@ -0,0 +1,306 @@
+"""
+Profiling opcional por requisição (CPU com cProfile + alocações com tracemalloc).
+
+Desligado por padrão. Com IPSEMG_PERFIL_HABILITADO=1, uma requisição é
+perfilada quando:
+    - traz o header "X-IPSEMG-Perfil: 1", ou
+    - cai na amostragem IPSEMG_PERFIL_AMOSTRAGEM (fração, 0.0 a 1.0).
+
+O que é medido:
+    - a thread do event loop só enquanto ela executa as tasks da requisição
+      (a do endpoint e as que ela cria): as tasks criadas com a sessão no
+      contexto têm a corrotina envolvida, e o cProfile do loop é ligado e
+      desligado a cada passo delas. Outras requisições atendidas no mesmo
+      período e o tempo ocioso do loop (select/epoll) ficam de fora;
+    - as funções marcadas com @perfilar que rodam em threads (preenchimento
+      do XLSX, soffice/PyMuPDF) enquanto pertencem àquela requisição;
+    - a diferença de memória alocada (tracemalloc) entre início e fim. Essa
+      é do processo inteiro: inclui o que outras requisições alocaram no
+      mesmo período.
+
+Só uma requisição é perfilada por vez (cProfile e tracemalloc são globais
+por thread/processo); as demais seguem sem profiling.
+
+Cada perfil gera, em IPSEMG_PERFIL_DIR:
+    <nome>.prof   estatísticas do cProfile (abrir com pstats / snakeviz)
+    <nome>.txt    resumo legível: funções mais caras + maiores alocações
+e só os IPSEMG_PERFIL_MAX mais recentes são mantidos.
+"""
+import asyncio
+import collections.abc
+import contextvars
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger("IPSEMG")
+
+PERFIL_HABILITADO = os.getenv("IPSEMG_PERFIL_HABILITADO", "").strip().lower() in ("1", "true", "sim")
+PERFIL_AMOSTRAGEM = float(os.getenv("IPSEMG_PERFIL_AMOSTRAGEM", "0") or 0)
+PERFIL_DIR = Path(os.getenv("IPSEMG_PERFIL_DIR", Path(tempfile.gettempdir()) / "ipsemg_perfis"))
+PERFIL_MAX = int(os.getenv("IPSEMG_PERFIL_MAX", "50"))
+HEADER_PERFIL = "X-IPSEMG-Perfil"
+
+_RE_NOME_ARQUIVO = re.compile(r"^[\w.-]+\.(prof|txt)$")
+
+sessao_perfil = contextvars.ContextVar("sessao_perfil", default=None)
+_perfil_ativo = threading.Lock()
+
+
+class SessaoPerfil:
+    """
+    Junta os perfis de todas as threads que trabalharam para uma requisição.
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.stats = None
+        self.profile = cProfile.Profile()   # thread do event loop
+        self.coletando = False
+        self.inicio = None
+        self.duracao = None
+        self.token = None
+        self._lock = threading.Lock()
+        self._snapshot_inicial = None
+        self._iniciou_tracemalloc = False
+
+    def adicionar(self, profile: cProfile.Profile):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def iniciar_memoria(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._iniciou_tracemalloc = True
+        self._snapshot_inicial = tracemalloc.take_snapshot()
+
+    def finalizar_memoria(self):
+        snapshot = tracemalloc.take_snapshot()
+        if self._iniciou_tracemalloc:
+            tracemalloc.stop()
+        filtros = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        return snapshot.filter_traces(filtros).compare_to(
+            self._snapshot_inicial.filter_traces(filtros), "lineno"
+        )
+
+    def salvar(self, diferencas_memoria, duracao: float) -> Path:
+        PERFIL_DIR.mkdir(parents=True, exist_ok=True)
+        base = PERFIL_DIR / self.nome
+
+        resumo = io.StringIO()
+        resumo.write(f"Perfil: {self.nome}\nDuração: {duracao:.4f}s\n\n")
+        if self.stats is not None:
+            self.stats.dump_stats(str(base.with_suffix(".prof")))
+            self.stats.stream = resumo
+            resumo.write("=== CPU (top 40 por tempo acumulado) ===\n")
+            self.stats.sort_stats("cumulative").print_stats(40)
+
+        resumo.write("\n=== Memória (top 30 alocações líquidas) ===\n")
+        for diferenca in diferencas_memoria[:30]:
+            resumo.write(f"{diferenca}\n")
+
+        base.with_suffix(".txt").write_text(resumo.getvalue(), encoding="utf-8")
+        _rotacionar()
+        return base
+
+
+def deve_perfilar(headers) -> bool:
+    if not PERFIL_HABILITADO:
+        return False
+    if headers.get(HEADER_PERFIL, "").strip().lower() in ("1", "true", "sim"):
+        return True
+    return PERFIL_AMOSTRAGEM > 0 and random.random() < PERFIL_AMOSTRAGEM
+
+
+class _CorrotinaPerfilada(collections.abc.Coroutine):
+    """
+    Corrotina de uma task da requisição perfilada: liga o cProfile do loop
+    só durante cada passo (send/throw) dela.
+    """
+
+    __slots__ = ("_coro", "_sessao")
+
+    def __init__(self, coro, sessao: SessaoPerfil):
+        self._coro = coro
+        self._sessao = sessao
+
+    def _passo(self, metodo, *args):
+        if not self._sessao.coletando:
+            return metodo(*args)
+        self._sessao.profile.enable()
+        try:
+            return metodo(*args)
+        finally:
+            self._sessao.profile.disable()
+
+    def send(self, valor):
+        return self._passo(self._coro.send, valor)
+
+    def throw(self, *args):
+        return self._passo(self._coro.throw, *args)
+
+    def close(self):
+        return self._coro.close()
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    def __getattr__(self, nome):
+        # cr_frame, cr_running, __qualname__...: o anyio olha o estado da
+        # corrotina da task para decidir se entrega o cancelamento
+        return getattr(self._coro, nome)
+
+
+def _instalar_fabrica_tasks():
+    """
+    Instala (uma vez por loop) a fábrica de tasks que envolve a corrotina
+    das tasks criadas com uma sessão de perfil no contexto. Fora disso a
+    task é criada normalmente.
+    """
+    loop = asyncio.get_running_loop()
+    anterior = loop.get_task_factory()
+    if getattr(anterior, "perfil_ipsemg", False):
+        return
+
+    def fabrica(loop, coro, **kwargs):
+        contexto = kwargs.get("context")
+        sessao = contexto.get(sessao_perfil) if contexto is not None else sessao_perfil.get()
+        if sessao is not None and sessao.coletando:
+            coro = _CorrotinaPerfilada(coro, sessao)
+        if anterior is not None:
+            return anterior(loop, coro, **kwargs)
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    fabrica.perfil_ipsemg = True
+    loop.set_task_factory(fabrica)
+
+
+def iniciar_sessao(metodo: str, rota: str, cid: str):
+    """
+    Começa a perfilar a requisição corrente (na thread do event loop): as
+    tasks criadas daqui em diante neste contexto entram no perfil.
+    Retorna None se já houver outra requisição sendo perfilada.
+    """
+    if not _perfil_ativo.acquire(blocking=False):
+        return None
+
+    rota_limpa = re.sub(r"[^\w-]+", "_", rota).strip("_") or "raiz"
+    # o cid pode vir do X-Request-ID do cliente: vai para o nome do arquivo
+    cid_limpo = re.sub(r"[^\w-]+", "_", cid).strip("_")[:12] or "sem_id"
+    nome = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')[:-3]}_{metodo.lower()}_{rota_limpa}_{cid_limpo}"
+    sessao = SessaoPerfil(nome)
+    try:
+        _instalar_fabrica_tasks()
+        sessao.iniciar_memoria()
+    except Exception as e:
+        _perfil_ativo.release()
+        logger.error(f"Erro ao iniciar perfil {nome}: {e}")
+        return None
+
+    sessao.inicio = time.perf_counter()
+    sessao.token = sessao_perfil.set(sessao)
+    sessao.coletando = True
+    return sessao
+
+
+def parar_sessao(sessao: SessaoPerfil):
+    """
+    Para a coleta (na thread do event loop, no mesmo contexto do
+    iniciar_sessao). A gravação fica para o finalizar_sessao.
+    """
+    sessao.coletando = False
+    sessao.duracao = time.perf_counter() - sessao.inicio
+    sessao_perfil.reset(sessao.token)
+
+
+def finalizar_sessao(sessao: SessaoPerfil):
+    """
+    Junta os perfis, compara a memória e grava os arquivos. É lento
+    (snapshot do tracemalloc, dump_stats, escrita em disco): rodar fora do
+    event loop, com asyncio.to_thread. Retorna o caminho base (sem
+    extensão), ou None se não deu para gravar: falha no profiling não
+    derruba a requisição.
+    """
+    try:
+        sessao.adicionar(sessao.profile)
+        base = sessao.salvar(sessao.finalizar_memoria(), sessao.duracao)
+        logger.info(f"Perfil salvo: {base.name} ({sessao.duracao:.3f}s)")
+        return base
+    except Exception as e:
+        logger.error(f"Erro ao gravar perfil {sessao.nome}: {e}")
+        return None
+    finally:
+        _perfil_ativo.release()
+
+
+def perfilar(func):
+    """
+    Para funções síncronas que rodam em threads (to_thread / pool): se a
+    requisição corrente estiver sendo perfilada, mede a execução nesta
+    thread e junta ao perfil da requisição. Caso contrário, custo zero.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        sessao = sessao_perfil.get()
+        if sessao is None:
+            return func(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile.disable()
+            sessao.adicionar(profile)
+    return wrapper
+
+
+# -------------------------------------------------
+# ARQUIVOS
+# -------------------------------------------------
+
+def _rotacionar():
+    perfis = sorted({p.stem for p in PERFIL_DIR.glob("*.txt")})
+    for antigo in perfis[:-PERFIL_MAX] if PERFIL_MAX > 0 else []:
+        for sufixo in (".prof", ".txt"):
+            (PERFIL_DIR / f"{antigo}{sufixo}").unlink(missing_ok=True)
+
+
+def listar_perfis() -> list:
+    if not PERFIL_DIR.exists():
+        return []
+    perfis = []
+    for arquivo in sorted(PERFIL_DIR.glob("*"), reverse=True):
+        if _RE_NOME_ARQUIVO.match(arquivo.name):
+            stat = arquivo.stat()
+            perfis.append({
+                "arquivo": arquivo.name,
+                "bytes": stat.st_size,
+                "criado_em": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+            })
+    return perfis
+
+
+def caminho_perfil(arquivo: str):
+    """
+    Caminho de um arquivo de perfil, ou None se o nome for inválido
+    (evita sair do PERFIL_DIR) ou o arquivo não existir.
+    """
+    if not _RE_NOME_ARQUIVO.match(arquivo):
+        return None
+    caminho = PERFIL_DIR / arquivo
+    return caminho if caminho.is_file() else None
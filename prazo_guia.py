@@ -0,0 +1,213 @@
+"""
+Prazos e cancelamento da geração de guias.
+
+Sem isso, um soffice travado segura a thread (e a vaga de admissão) para
+sempre, e um cliente que desistiu continua custando soffice + PyMuPDF.
+
+    - prazo de ponta a ponta por guia (IPSEMG_PRAZO_GUIA, padrão 90s),
+      contado a partir da admissão;
+    - prazo por chamada do soffice (IPSEMG_PRAZO_SOFFICE, padrão 45s por
+      arquivo, limitado ao que resta do prazo da guia);
+    - um vigia no event loop que percebe desconexão do cliente ou prazo
+      esgotado e interrompe a guia: mata o grupo de processos do soffice e
+      faz as etapas seguintes (corte, marca d'água, raster) nem começarem.
+
+A desconexão é observada desde antes da fila de admissão: quem desiste
+enquanto espera vaga sai da fila sem chegar a rodar o soffice.
+
+O Prazo da guia corrente fica num contextvar, então chega sozinho às
+threads (asyncio.to_thread / pool de preenchimento copiam o contexto).
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import asynccontextmanager, nullcontext
+
+logger = logging.getLogger("IPSEMG")
+
+PRAZO_GUIA = float(os.getenv("IPSEMG_PRAZO_GUIA", "90"))
+PRAZO_SOFFICE = float(os.getenv("IPSEMG_PRAZO_SOFFICE", "45"))
+INTERVALO_VIGIA = 0.25
+
+MOTIVO_PRAZO = "prazo"
+MOTIVO_CLIENTE = "cliente_desconectou"
+
+prazo_atual = contextvars.ContextVar("prazo_atual", default=None)
+
+_metricas_lock = threading.Lock()
+_metricas = {
+    "interrompidas_prazo": 0,
+    "interrompidas_cliente": 0,
+    "soffice_finalizados": 0,
+}
+
+
+def _contar(chave: str):
+    with _metricas_lock:
+        _metricas[chave] += 1
+
+
+class RenderInterrompido(RuntimeError):
+    """
+    A guia foi interrompida (prazo esgotado ou cliente desconectou).
+    """
+
+    def __init__(self, motivo: str, etapa: str):
+        super().__init__(f"Render interrompido na etapa '{etapa}': {motivo}")
+        self.motivo = motivo
+        self.etapa = etapa
+
+
+def finalizar_processo(proc: subprocess.Popen):
+    """
+    Mata o soffice e os filhos dele (soffice.bin): o Popen é criado com
+    start_new_session, então o grupo de processos é só dele.
+    """
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        return
+    _contar("soffice_finalizados")
+
+
+class Prazo:
+    """
+    Prazo + sinal de interrupção de uma guia. `interrompido` é um
+    threading.Event: é setado no event loop e lido nas threads.
+    """
+
+    def __init__(self, segundos: float):
+        self.limite = time.monotonic() + segundos
+        self.interrompido = threading.Event()
+        self.motivo = None
+        self._processos = set()
+        self._lock = threading.Lock()
+
+    def restante(self) -> float:
+        return self.limite - time.monotonic()
+
+    def interromper(self, motivo: str):
+        with self._lock:
+            if self.interrompido.is_set():
+                return
+            self.motivo = motivo
+            self.interrompido.set()
+            processos = list(self._processos)
+        for proc in processos:
+            finalizar_processo(proc)
+
+    def verificar(self, etapa: str):
+        """
+        Chamado antes/depois de cada etapa: levanta RenderInterrompido se a
+        guia já foi interrompida ou se o prazo acabou.
+        """
+        if not self.interrompido.is_set() and self.restante() <= 0:
+            self.interromper(MOTIVO_PRAZO)
+        if self.interrompido.is_set():
+            raise RenderInterrompido(self.motivo, etapa)
+
+    def registrar_processo(self, proc: subprocess.Popen):
+        with self._lock:
+            self._processos.add(proc)
+            interrompido = self.interrompido.is_set()
+        if interrompido:
+            finalizar_processo(proc)
+
+    def remover_processo(self, proc: subprocess.Popen):
+        with self._lock:
+            self._processos.discard(proc)
+
+
+def verificar_prazo(etapa: str):
+    """
+    Verifica o prazo da guia corrente, se houver (no modo CLI não há).
+    """
+    prazo = prazo_atual.get()
+    if prazo is not None:
+        prazo.verificar(etapa)
+
+
+def timeout_soffice(quantidade_arquivos: int = 1) -> float:
+    """
+    Tempo máximo para uma chamada do soffice com `quantidade_arquivos`,
+    limitado ao que resta do prazo da guia corrente.
+    """
+    timeout = PRAZO_SOFFICE * max(1, quantidade_arquivos)
+    prazo = prazo_atual.get()
+    if prazo is not None:
+        timeout = min(timeout, prazo.restante())
+    return max(0.0, timeout)
+
+
+async def _aguardar_desconexao(request):
+    # O corpo já foi lido pelo FastAPI: a próxima mensagem do servidor é o
+    # http.disconnect. (request.is_disconnected() não serve aqui: ele só
+    # olha sem esperar, e atrás dos middlewares @app.middleware nunca vê nada.)
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+async def _vigiar(prazo: Prazo, desconexao):
+    while not prazo.interrompido.is_set():
+        if prazo.restante() <= 0:
+            prazo.interromper(MOTIVO_PRAZO)
+            return
+        if desconexao is not None and desconexao.done() and desconexao.exception() is None:
+            prazo.interromper(MOTIVO_CLIENTE)
+            return
+        await asyncio.sleep(INTERVALO_VIGIA)
+
+
+@asynccontextmanager
+async def guia_com_prazo(request=None, segundos: float = PRAZO_GUIA, admissao=None):
+    """
+    Envolve a geração de uma guia: espera a vaga em `admissao` (um
+    ControleAdmissao, opcional), instala o Prazo no contexto, sobe o
+    vigia e traduz a interrupção em resposta HTTP (504 no prazo; 499 se
+    o cliente desconectou, que ninguém vai ler, mas fica no log).
+    """
+    # import local: o converte_em_pdf (CLI) usa este módulo sem o FastAPI
+    from fastapi import HTTPException
+
+    # uma task só lê o receive() da requisição: a mesma serve para a fila
+    # de admissão e para o vigia
+    desconexao = asyncio.ensure_future(_aguardar_desconexao(request)) if request is not None else None
+    try:
+        async with (admissao.vaga(desistencia=desconexao) if admissao is not None else nullcontext()):
+            prazo = Prazo(segundos)
+            token = prazo_atual.set(prazo)
+            vigia = asyncio.create_task(_vigiar(prazo, desconexao))
+            try:
+                yield prazo
+            except RenderInterrompido as e:
+                if e.motivo == MOTIVO_CLIENTE:
+                    _contar("interrompidas_cliente")
+                    logger.warning(f"Guia cancelada: cliente desconectou (etapa {e.etapa})")
+                    raise HTTPException(status_code=499, detail="Cliente desconectou")
+                _contar("interrompidas_prazo")
+                logger.error(f"Guia interrompida por prazo após {segundos - prazo.restante():.1f}s (etapa {e.etapa})")
+                raise HTTPException(status_code=504, detail="Tempo limite para gerar a guia esgotado")
+            finally:
+                vigia.cancel()
+                prazo_atual.reset(token)
+    finally:
+        if desconexao is not None:
+            desconexao.cancel()
+
+
+def metricas() -> dict:
+    with _metricas_lock:
+        dados = dict(_metricas)
+    dados["prazo_guia_s"] = PRAZO_GUIA
+    dados["prazo_soffice_s"] = PRAZO_SOFFICE
+    return dados
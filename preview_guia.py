@@ -0,0 +1,198 @@
+"""
+Pré-visualização rápida (PNG/WebP) de uma guia preenchida.
+
+O caminho completo (soffice + corte + marca d'água + raster a 150 DPI) leva
+segundos. Para o preview isso é feito uma vez só por template:
+    - o template em branco é convertido em PDF (página 1 guardada em memória);
+    - uma cópia com um marcador curto em cada campo é convertida junto, e a
+      posição de cada marcador no PDF dá o retângulo de cada célula.
+
+A calibração roda o soffice: no main.py ela passa pela admissão e pelo
+prazo das guias (como uma guia). Se falhar, novas tentativas só depois de
+IPSEMG_PREVIEW_ESPERA_FALHA segundos (padrão 60); até lá o preview daquele
+template falha na hora, sem rodar o soffice de novo.
+
+Por requisição, o preview só escreve os valores nessas posições sobre a
+página em branco e rasteriza em baixa resolução (IPSEMG_PREVIEW_DPI, padrão
+60). O PDF de verdade só é gerado na confirmação (rotas normais da guia).
+
+Campos mesclados em várias linhas (a indicação clínica da Internação,
+B53:AH57, com quebra de texto) são escritos numa caixa do tamanho do
+intervalo inteiro, com quebra de linha, como no PDF final. A caixa parte do
+marcador (esses campos são alinhados no topo à esquerda nos templates) e o
+tamanho vem das larguras de coluna e alturas de linha do template.
+"""
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from converte_em_pdf import xlsx_to_pdf_lote
+from template_xlsx import TemplateXlsx, indice_para_coluna
+
+logger = logging.getLogger("IPSEMG")
+
+PREVIEW_DPI = int(os.getenv("IPSEMG_PREVIEW_DPI", "60"))
+FORMATOS_PREVIEW = {"png": "image/png", "webp": "image/webp"}
+PREVIEW_ESPERA_FALHA = float(os.getenv("IPSEMG_PREVIEW_ESPERA_FALHA", "60"))
+
+_ALFABETO = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# distância entre o texto e a borda da célula no PDF do soffice (pontos)
+_FOLGA_CELULA = 1.5
+_FONTE_MINIMA = 4.0
+
+
+def _marcador(indice: int) -> str:
+    # curto de propósito: células estreitas (dia/mês/ano) cortariam um marcador longo
+    return "Z" + _ALFABETO[indice // 36] + _ALFABETO[indice % 36] + "Z"
+
+
+class PreviewGuia:
+    """
+    Página em branco + posição de cada campo de um template.
+    """
+
+    def __init__(self, template: TemplateXlsx, coords):
+        import fitz
+
+        alvos = sorted({template.resolver(coord) for coord in coords})
+        marcadores = {_marcador(i): alvo for i, alvo in enumerate(alvos)}
+
+        with tempfile.TemporaryDirectory(prefix="ipsemg_preview_") as tmp:
+            branco = Path(tmp) / "branco.xlsx"
+            calibracao = Path(tmp) / "calibracao.xlsx"
+            template.preencher({}, branco)
+            template.preencher(
+                {f"{indice_para_coluna(col)}{lin}": m for m, (col, lin) in marcadores.items()},
+                calibracao,
+            )
+            pdf_branco, pdf_calibracao = xlsx_to_pdf_lote([branco, calibracao])
+
+            doc = fitz.open(pdf_branco)
+            doc.select([0])
+            self.pdf_branco = doc.tobytes(garbage=4, deflate=True)
+            doc.close()
+
+            self.posicoes = {}
+            self.caixas = {}    # campos mesclados em várias linhas -> retângulo do intervalo
+            doc = fitz.open(pdf_calibracao)
+            pagina = doc[0]
+            for marcador, alvo in marcadores.items():
+                achados = pagina.search_for(marcador)
+                if achados:
+                    rect = achados[0]
+                    self.posicoes[alvo] = rect
+                    if template.intervalos.get(alvo, alvo)[1] > alvo[1]:
+                        largura, altura = template.tamanho_intervalo(alvo)
+                        self.caixas[alvo] = fitz.Rect(
+                            rect.x0,
+                            rect.y0,
+                            rect.x0 + largura - 2 * _FOLGA_CELULA,
+                            rect.y0 + altura - _FOLGA_CELULA,
+                        ) & pagina.rect
+                else:
+                    logger.debug("Preview: campo %s%s não localizado no PDF",
+                                 indice_para_coluna(alvo[0]), alvo[1])
+            doc.close()
+
+        self.template = template
+
+    def renderizar(self, campos: dict, formato: str = "png", dpi: int = PREVIEW_DPI) -> bytes:
+        import fitz
+
+        doc = fitz.open("pdf", self.pdf_branco)
+        pagina = doc[0]
+
+        for coord, valor in campos.items():
+            if valor is None or valor == "":
+                continue
+            alvo = self.template.resolver(coord)
+            rect = self.posicoes.get(alvo)
+            if rect is None:
+                continue
+            tamanho = max(_FONTE_MINIMA, rect.height / 1.2)
+            caixa = self.caixas.get(alvo)
+            if caixa is not None:
+                self._escrever_caixa(pagina, caixa, str(valor), tamanho)
+                continue
+            pagina.insert_text(
+                fitz.Point(rect.x0, rect.y1 - rect.height * 0.2),
+                str(valor),
+                fontsize=tamanho,
+                fontname="helv",
+            )
+
+        pix = pagina.get_pixmap(dpi=dpi, alpha=False)
+        doc.close()
+
+        if formato == "webp":
+            from PIL import Image
+
+            imagem = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+            saida = io.BytesIO()
+            imagem.save(saida, "WEBP", quality=70)
+            return saida.getvalue()
+
+        return pix.tobytes("png")
+
+    @staticmethod
+    def _escrever_caixa(pagina, caixa, texto: str, tamanho: float):
+        """
+        Texto com quebra de linha dentro da caixa. O insert_textbox não
+        escreve nada se o texto não couber: aí reduz a fonte até caber.
+        """
+        while True:
+            sobra = pagina.insert_textbox(caixa, texto, fontsize=tamanho, fontname="helv")
+            if sobra >= 0 or tamanho <= _FONTE_MINIMA:
+                return
+            tamanho = max(_FONTE_MINIMA, tamanho * 0.85)
+
+
+_previews = {}
+_falhas = {}    # chave -> (time.monotonic() da falha, mensagem)
+_previews_lock = threading.Lock()
+
+
+def preview_calibrado(chave: str) -> bool:
+    return chave in _previews
+
+
+def _verificar_falha_recente(chave: str):
+    falha = _falhas.get(chave)
+    if falha is not None and time.monotonic() - falha[0] < PREVIEW_ESPERA_FALHA:
+        raise RuntimeError(f"Calibração do preview {chave} falhou há pouco: {falha[1]}")
+
+
+def obter_preview(chave: str, template: TemplateXlsx, coords) -> PreviewGuia:
+    """
+    PreviewGuia em cache por template. A primeira chamada roda o soffice
+    (sob lock, para não calibrar o mesmo template duas vezes).
+    """
+    preview = _previews.get(chave)
+    if preview is not None:
+        return preview
+
+    _verificar_falha_recente(chave)
+    with _previews_lock:
+        preview = _previews.get(chave)
+        if preview is None:
+            _verificar_falha_recente(chave)
+            try:
+                preview = PreviewGuia(template, coords)
+            except Exception as e:
+                _falhas[chave] = (time.monotonic(), str(e))
+                raise
+            _falhas.pop(chave, None)
+            _previews[chave] = preview
+            logger.info(f"Preview do template {chave} calibrado ({len(preview.posicoes)} campos)")
+        return preview
+
+
+def gerar_preview(chave: str, template: TemplateXlsx, campos: dict, formato: str = "png") -> bytes:
+    if formato not in FORMATOS_PREVIEW:
+        raise ValueError(f"Formato de preview inválido: {formato}")
+    return obter_preview(chave, template, campos.keys()).renderizar(campos, formato)
@@ -0,0 +1,218 @@
+"""
+Reconciliação em lote: nomes de exame em texto livre -> códigos IPSEMG.
+
+Lê um CSV ou JSONL de termos em streaming, roda a mesma busca do
+/buscar-chbpm (busca_cbhpm.buscar_chbpm) em um pool de processos, com o
+catálogo carregado uma vez por processo, e grava os k melhores códigos de
+cada linha à medida que ficam prontos, na ordem da entrada.
+
+Uso:
+    python reconciliar_codigos.py entrada.csv saida.csv --coluna exame --top-k 3
+    python reconciliar_codigos.py entrada.jsonl saida.jsonl --campo termo
+    python reconciliar_codigos.py entrada.csv saida.csv --continuar
+
+Formato pela extensão (.csv ou .jsonl). Com --continuar, as linhas já
+gravadas na saída são puladas na entrada e o resto é acrescentado (uma
+linha incompleta no fim da saída, de uma execução interrompida, é descartada).
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+import busca_cbhpm
+
+_top_k = 3
+
+
+def _inicializar_worker(top_k: int):
+    global _top_k
+    _top_k = top_k
+    # uma linha de log por busca em milhões de linhas não serve para nada
+    logging.getLogger("IPSEMG").setLevel(logging.WARNING)
+    busca_cbhpm.carregar_dados_cbhpm_ipsemg()
+
+
+def _reconciliar(termo: str) -> list:
+    if not termo:
+        return []
+    return busca_cbhpm.buscar_chbpm(termo, limite=_top_k).get("sugestoes", [])
+
+
+# -------------------------------------------------
+# ENTRADA / SAÍDA
+# -------------------------------------------------
+
+def _formato(caminho: Path) -> str:
+    return "jsonl" if caminho.suffix.lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def ler_termos(caminho: Path, coluna: str | None):
+    """
+    Gera os termos da entrada, um por linha, sem carregar o arquivo todo.
+    """
+    with open(caminho, encoding="utf-8-sig", newline="") as f:
+        if _formato(caminho) == "jsonl":
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                dado = json.loads(linha)
+                yield str(dado.get(coluna or "exame", "") if isinstance(dado, dict) else dado)
+        else:
+            leitor = csv.reader(f)
+            cabecalho = next(leitor, None)
+            if cabecalho is None:
+                return
+            indice = 0
+            if coluna:
+                if coluna not in cabecalho:
+                    raise SystemExit(f"Coluna '{coluna}' não encontrada no CSV: {cabecalho}")
+                indice = cabecalho.index(coluna)
+            for registro in leitor:
+                yield registro[indice] if indice < len(registro) else ""
+
+
+def _preparar_continuacao(caminho: Path) -> int:
+    """
+    Descarta uma linha incompleta no fim da saída e devolve quantas
+    linhas de dados já estão gravadas.
+    """
+    with open(caminho, "rb+") as f:
+        tamanho = f.seek(0, os.SEEK_END)
+        if tamanho == 0:
+            return 0
+        # volta até o último "\n" se o arquivo não terminar nele
+        f.seek(tamanho - 1)
+        if f.read(1) != b"\n":
+            pos = tamanho - 1
+            while pos > 0:
+                f.seek(pos - 1)
+                if f.read(1) == b"\n":
+                    break
+                pos -= 1
+            f.truncate(pos)
+
+    with open(caminho, encoding="utf-8") as f:
+        total = sum(1 for _ in f)
+    return total - 1 if _formato(caminho) == "csv" else total
+
+
+class EscritorSaida:
+    def __init__(self, caminho: Path, top_k: int, acrescentar: bool):
+        self.formato = _formato(caminho)
+        self.top_k = top_k
+        self.arquivo = open(caminho, "a" if acrescentar else "w", encoding="utf-8", newline="")
+        if self.formato == "csv":
+            self.csv = csv.writer(self.arquivo)
+            if not acrescentar:
+                cabecalho = ["linha", "termo"]
+                for k in range(1, top_k + 1):
+                    cabecalho += [f"codigo_{k}", f"descricao_{k}", f"score_{k}"]
+                self.csv.writerow(cabecalho)
+
+    def escrever(self, numero: int, termo: str, sugestoes: list):
+        # quebra de linha dentro do termo atrapalharia a contagem do --continuar
+        termo = " ".join(termo.split())
+        if self.formato == "jsonl":
+            self.arquivo.write(json.dumps(
+                {"linha": numero, "termo": termo, "sugestoes": sugestoes}, ensure_ascii=False
+            ) + "\n")
+            return
+
+        registro = [numero, termo]
+        for k in range(self.top_k):
+            if k < len(sugestoes):
+                s = sugestoes[k]
+                registro += [s["codigo"], " ".join(s["descricao"].split()), s["score"]]
+            else:
+                registro += ["", "", ""]
+        self.csv.writerow(registro)
+
+    def flush(self):
+        self.arquivo.flush()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+# -------------------------------------------------
+# EXECUÇÃO
+# -------------------------------------------------
+
+def reconciliar(entrada: Path, saida: Path, coluna: str | None, top_k: int,
+                processos: int, chunksize: int, continuar: bool) -> int:
+    ja_feitas = _preparar_continuacao(saida) if continuar and saida.exists() else 0
+    termos = ler_termos(entrada, coluna)
+    if ja_feitas:
+        print(f"Continuando: {ja_feitas} linha(s) já reconciliadas, pulando na entrada.", file=sys.stderr)
+        termos = islice(termos, ja_feitas, None)
+
+    # carrega no processo pai: com fork, os workers já nascem com o catálogo
+    _inicializar_worker(top_k)
+
+    escritor = EscritorSaida(saida, top_k, acrescentar=ja_feitas > 0)
+    # o imap consome o iterável inteiro de uma vez; em janelas a memória fica limitada
+    janela = max(1, processos) * chunksize * 4
+    numero = ja_feitas
+    inicio = time.time()
+    ultimo_progresso = inicio
+
+    try:
+        with multiprocessing.Pool(processos, initializer=_inicializar_worker, initargs=(top_k,)) as pool:
+            while True:
+                lote = list(islice(termos, janela))
+                if not lote:
+                    break
+                for termo, sugestoes in zip(lote, pool.imap(_reconciliar, lote, chunksize=chunksize)):
+                    numero += 1
+                    escritor.escrever(numero, termo, sugestoes)
+
+                escritor.flush()
+                agora = time.time()
+                if agora - ultimo_progresso >= 2:
+                    feitas = numero - ja_feitas
+                    print(f"[progresso] {numero} linhas ({feitas / (agora - inicio):.0f} linhas/s)", file=sys.stderr)
+                    ultimo_progresso = agora
+    finally:
+        escritor.fechar()
+
+    duracao = time.time() - inicio
+    feitas = numero - ja_feitas
+    print(
+        f"Concluído: {feitas} linha(s) em {duracao:.1f}s "
+        f"({feitas / duracao if duracao else 0:.0f} linhas/s) -> {saida}",
+        file=sys.stderr,
+    )
+    return feitas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconcilia nomes de exame com códigos IPSEMG em lote.")
+    parser.add_argument("entrada", type=Path, help="CSV (com cabeçalho) ou JSONL de termos")
+    parser.add_argument("saida", type=Path, help="CSV ou JSONL de saída")
+    parser.add_argument("--coluna", "--campo", dest="coluna", default=None,
+                        help="coluna do CSV / campo do JSONL com o termo (padrão: 1ª coluna / 'exame')")
+    parser.add_argument("--top-k", type=int, default=3, help="quantos códigos por linha (padrão 3)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos no pool (padrão: nº de CPUs)")
+    parser.add_argument("--chunksize", type=int, default=256, help="termos por tarefa enviada a cada processo")
+    parser.add_argument("--continuar", action="store_true",
+                        help="retoma uma execução interrompida, acrescentando à saída existente")
+    args = parser.parse_args(argv)
+
+    if not args.entrada.exists():
+        parser.error(f"Entrada não encontrada: {args.entrada}")
+
+    reconciliar(args.entrada, args.saida, args.coluna, args.top_k,
+                args.processos, args.chunksize, args.continuar)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Respostas HTTP para as rotas de alto volume.
+
+    - RespostaJson: JSONResponse que serializa com orjson quando ele está
+      instalado (cai para o json padrão se não estiver). Devolvida direto
+      pela rota, também pula o jsonable_encoder do FastAPI.
+    - Compressão: brotli (pacote brotli-asgi) com fallback para gzip, ou só
+      gzip (Starlette). Respostas menores que IPSEMG_COMPRESSAO_MIN_BYTES
+      (padrão 1024) saem sem compressão, e PDF e imagens (já comprimidos)
+      nunca são recomprimidos: no gzip pelo Content-Type, no brotli pelas
+      rotas que os devolvem (o brotli-asgi só sabe excluir por rota).
+    - Resposta enxuta das guias: pedida com ?resposta=enxuta ou com o header
+      "Prefer: return=minimal" (RFC 7240). O PDF fica num link assinado e
+      com validade (HMAC do guia_id + expiração).
+
+Configuração por variáveis de ambiente:
+    IPSEMG_COMPRESSAO            "auto" (padrão: brotli se instalado, senão
+                                 gzip), "gzip" ou "nenhuma"
+    IPSEMG_COMPRESSAO_MIN_BYTES  tamanho mínimo para comprimir
+    IPSEMG_SEGREDO_LINKS         chave dos links assinados (padrão: aleatória
+                                 por processo; com preload_app os workers do
+                                 gunicorn herdam a mesma)
+    IPSEMG_VALIDADE_LINKS        validade dos links em segundos (padrão 900)
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele, json padrão
+    orjson = None
+
+COMPRESSAO = os.getenv("IPSEMG_COMPRESSAO", "auto").strip().lower()
+COMPRESSAO_MIN_BYTES = int(os.getenv("IPSEMG_COMPRESSAO_MIN_BYTES", "1024"))
+COMPRESSAO_NIVEL_GZIP = 5      # 9 custa bem mais CPU para ganhar pouco em JSON
+COMPRESSAO_QUALIDADE_BROTLI = 4
+
+SEGREDO_LINKS = (os.getenv("IPSEMG_SEGREDO_LINKS") or secrets.token_hex(32)).encode()
+VALIDADE_LINKS = int(os.getenv("IPSEMG_VALIDADE_LINKS", "900"))
+
+
+class RespostaJson(JSONResponse):
+    """
+    Mesmo JSON do JSONResponse (UTF-8, sem escapar acentos), via orjson.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def resposta_enxuta_pedida(request, resposta: str | None = None) -> bool:
+    if (resposta or "").strip().lower() == "enxuta":
+        return True
+    return "return=minimal" in request.headers.get("Prefer", "").lower()
+
+
+def _assinatura_link(guia_id: str, expira: int) -> str:
+    return hmac.new(SEGREDO_LINKS, f"{guia_id}:{expira}".encode(), hashlib.sha256).hexdigest()
+
+
+def link_assinado(caminho: str, guia_id: str) -> str:
+    """
+    `caminho` com ?expira=...&assinatura=... para baixar a guia `guia_id`.
+    """
+    expira = int(time.time()) + VALIDADE_LINKS
+    return f"{caminho}?expira={expira}&assinatura={_assinatura_link(guia_id, expira)}"
+
+
+def link_valido(guia_id: str, expira: int | None, assinatura: str | None) -> bool:
+    if expira is None or not assinatura or expira < time.time():
+        return False
+    return hmac.compare_digest(assinatura, _assinatura_link(guia_id, expira))
+
+
+def configurar_compressao(app, rotas_binarias=()) -> str:
+    """
+    Adiciona o middleware de compressão e retorna qual ("brotli", "gzip"
+    ou "nenhuma"). No main.py fica antes dos @app.middleware: eles repassam
+    o corpo em pedaços e, por fora deles, o mínimo de bytes não funcionaria.
+    `rotas_binarias` (regex de caminho) são as rotas que devolvem PDF ou
+    imagem, que o brotli deixa passar sem comprimir.
+    """
+    if COMPRESSAO in ("nenhuma", "0", "false"):
+        return "nenhuma"
+
+    from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware
+
+    if COMPRESSAO == "auto":
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            BrotliMiddleware = None
+        if BrotliMiddleware is not None:
+            # o brotli-asgi não olha o Content-Type: as rotas de PDF/imagem
+            # ficam de fora inteiras (inclusive do gzip de fallback dele)
+            app.add_middleware(
+                BrotliMiddleware,
+                quality=COMPRESSAO_QUALIDADE_BROTLI,
+                minimum_size=COMPRESSAO_MIN_BYTES,
+                gzip_fallback=True,
+                excluded_handlers=list(rotas_binarias),
+            )
+            return "brotli"
+
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=COMPRESSAO_MIN_BYTES,
+        compresslevel=COMPRESSAO_NIVEL_GZIP,
+        exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/pdf",),
+    )
+    return "gzip"
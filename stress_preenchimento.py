@@ -0,0 +1,187 @@
+"""
+Teste de estresse do preenchimento concorrente das guias.
+
+Preenche centenas de guias SADT e Internação ao mesmo tempo pelo
+POOL_PREENCHIMENTO do main.py, nos dois motores (direto e openpyxl), e
+depois reabre cada XLSX gerado conferindo que ele tem os dados da PRÓPRIA
+guia: cada campo (nome, códigos, descrições...) e o logo do IPSEMG.
+Qualquer mistura entre guias (estado compartilhado entre threads) aparece
+como divergência.
+
+Também mede a vazão com 1 thread e com o pool inteiro. O preenchimento
+pelo openpyxl é Python puro e segura o GIL: mais threads no mesmo processo
+não o fazem escalar entre núcleos (o pool só tira o trabalho do event loop).
+A escala entre núcleos em produção vem dos workers do gunicorn
+(gunicorn.conf.py). O motor direto passa boa parte do tempo no zlib, que
+solta o GIL, e por isso ganha algo com threads.
+
+Uso:
+    python stress_preenchimento.py
+    python stress_preenchimento.py --guias 400 --motor direto
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import main
+from main import IpsemgPayload
+
+MOTORES = ("direto", "openpyxl")
+
+# (template, montar_campos, coordenada do nome do beneficiário)
+GUIAS = {
+    "sadt": (main.IPSEMG_SADT, main._campos_ipsemg_sadt, "B7", main.MAX_LINHAS_SADT),
+    "internacao": (main.IPSEMG_INTERNACAO, main._campos_ipsemg_internacao, "B20", main.MAX_LINHAS_INTERNACAO),
+}
+
+
+def montar_payload(numero: int, max_linhas: int) -> IpsemgPayload:
+    """
+    Payload com dados únicos da guia `numero` (nome, códigos e descrições).
+    """
+    linhas = 1 + numero % max_linhas
+    return IpsemgPayload(
+        nome_beneficiario=f"BENEFICIARIO TESTE {numero:05d}",
+        matricula=f"{numero:012d}",
+        prestador="HOSPITAL EXEMPLO",
+        uf="MG",
+        especialidade="CLINICA MEDICA",
+        crm=f"{10000 + numero}",
+        carater="ELETIVO" if numero % 2 else "URGENCIA",
+        cid="I10",
+        solicitante=f"DR. SOLICITANTE {numero:05d}",
+        indicacao_clinica=f"Indicação clínica da guia {numero:05d}",
+        hipotese="HAS",
+        codigos=[f"4.{numero:05d}.{linha:02d}" for linha in range(linhas)],
+        descricao=[f"EXAME {linha} DA GUIA {numero:05d}" for linha in range(linhas)],
+        quantidades=[1 + (numero + linha) % 3 for linha in range(linhas)],
+        data_nascimento="01/01/1960",
+        assinatura=f"DR. SOLICITANTE {numero:05d}",
+        data="06/12/2025",
+    )
+
+
+def preencher(motor: str, tipo: str, payload: IpsemgPayload, destino: Path) -> dict:
+    template, montar_campos, _, _ = GUIAS[tipo]
+    campos = montar_campos(payload)
+    if motor == "direto":
+        main._template_xlsx(template).preencher(campos, destino)
+    else:
+        main.preencher_xlsx_openpyxl(template, campos, destino)
+    return campos
+
+
+def _normalizar(valor):
+    if valor is None or valor == "":
+        return None
+    return str(valor)
+
+
+def conferir(tipo: str, payload: IpsemgPayload, campos: dict, xlsx: Path) -> list:
+    """
+    Reabre o XLSX e lista as divergências em relação aos dados da guia.
+    """
+    import openpyxl
+
+    template, _, coord_nome, _ = GUIAS[tipo]
+    resolver = main._template_xlsx(template).resolver
+    ws = openpyxl.load_workbook(xlsx).active
+    erros = []
+
+    def valor(coord):
+        coluna, linha = resolver(coord)
+        return ws.cell(row=linha, column=coluna).value
+
+    for coord, esperado in campos.items():
+        lido = valor(coord)
+        if _normalizar(lido) != _normalizar(esperado):
+            erros.append(f"{coord}: esperado {esperado!r}, lido {lido!r}")
+
+    if valor(coord_nome) != payload.nome_beneficiario:
+        erros.append(f"nome: {valor(coord_nome)!r}")
+    lidos = {_normalizar(c.value) for linha in ws.iter_rows() for c in linha}
+    faltando = [codigo for codigo in payload.codigos if codigo not in lidos]
+    if faltando:
+        erros.append(f"códigos ausentes: {faltando}")
+
+    imagens = ws._images
+    if len(imagens) != 1:
+        erros.append(f"{len(imagens)} imagens na planilha (esperado 1 logo)")
+    elif imagens[0]._data() != main._logo_ipsemg_bytes():
+        erros.append("logo diferente do logo_ipsemg.png")
+    elif (imagens[0].anchor._from.col, imagens[0].anchor._from.row) != (1, 0):
+        erros.append("logo fora de B1")
+
+    return erros
+
+
+def rodar(pool, motor: str, guias: list, pasta: Path) -> tuple:
+    """
+    Preenche todas as `guias` no `pool`; retorna (segundos, resultados).
+    """
+    inicio = time.perf_counter()
+    futuros = [
+        (tipo, payload, destino, pool.submit(preencher, motor, tipo, payload, destino))
+        for tipo, payload, destino in (
+            (tipo, payload, pasta / f"{motor}_{tipo}_{numero:05d}.xlsx")
+            for numero, (tipo, payload) in enumerate(guias)
+        )
+    ]
+    resultados = [(tipo, payload, destino, futuro.result()) for tipo, payload, destino, futuro in futuros]
+    return time.perf_counter() - inicio, resultados
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Estresse do preenchimento concorrente das guias.")
+    parser.add_argument("--guias", type=int, default=300, help="guias por motor, metade de cada tipo (padrão 300)")
+    parser.add_argument("--motor", choices=MOTORES + ("todos",), default="todos")
+    args = parser.parse_args(argv)
+
+    # o import do main configura o logger do IPSEMG (nível INFO)
+    logging.getLogger("IPSEMG").setLevel(logging.WARNING)
+
+    guias = []
+    for numero in range(args.guias):
+        tipo = "sadt" if numero % 2 == 0 else "internacao"
+        guias.append((tipo, montar_payload(numero, GUIAS[tipo][3])))
+
+    # aquece templates e logo fora da medição
+    for template, _, _, _ in GUIAS.values():
+        main._template_xlsx(template)
+
+    motores = MOTORES if args.motor == "todos" else (args.motor,)
+    threads = main.THREADS_PREENCHIMENTO
+    print(f"{args.guias} guias por motor | POOL_PREENCHIMENTO: {threads} threads\n")
+    print(f"{'motor':<10} {'1 thread':>10} {f'{threads} threads':>12} {'ganho':>7} {'erradas':>8}")
+
+    total_erros = 0
+    with tempfile.TemporaryDirectory(prefix="ipsemg_estresse_") as tmp:
+        pasta = Path(tmp)
+        for motor in motores:
+            with ThreadPoolExecutor(max_workers=1) as uma_thread:
+                serial, _ = rodar(uma_thread, motor, guias, pasta)
+            paralelo, resultados = rodar(main.POOL_PREENCHIMENTO, motor, guias, pasta)
+
+            erradas = 0
+            for tipo, payload, destino, campos in resultados:
+                erros = conferir(tipo, payload, campos, destino)
+                if erros:
+                    erradas += 1
+                    if erradas <= 5:
+                        print(f"  {destino.name}: {'; '.join(erros[:3])}")
+            total_erros += erradas
+
+            print(f"{motor:<10} {args.guias / serial:>8.1f}/s {args.guias / paralelo:>10.1f}/s "
+                  f"{serial / paralelo:>6.2f}x {erradas:>8}")
+
+    print("\nOK: cada guia tem os próprios dados e o logo" if total_erros == 0
+          else f"\nFALHOU: {total_erros} guias com dados errados")
+    return 1 if total_erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
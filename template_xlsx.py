@@ -0,0 +1,418 @@
+"""
+Preenchimento direto de XLSX, sem openpyxl por requisição.
+
+Um XLSX é um zip; para preencher ~80 células de uma guia só o XML da planilha
+ativa muda. O TemplateXlsx faz o trabalho pesado uma vez só:
+    - lê o zip base e localiza o XML da planilha ativa;
+    - indexa a posição (offsets) de cada <row> e <c> dentro do <sheetData>;
+    - resolve células mescladas para a célula superior esquerda (e guarda o
+      tamanho de cada intervalo mesclado, usado pelo preview);
+    - deixa pronto o zip com todos os outros membros já comprimidos.
+
+Por requisição, `preencher()` só aplica os patches nas células pedidas e
+escreve um zip novo: os outros membros são copiados byte a byte (inclusive
+os dados comprimidos) e só a planilha é comprimida de novo.
+
+Strings são gravadas como inlineStr, para não precisar reescrever o
+sharedStrings.xml; o LibreOffice renderiza igual.
+"""
+import io
+import re
+import struct
+import zipfile
+import zlib
+from datetime import datetime
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# mesmos caracteres que o openpyxl recusa (IllegalCharacterError)
+_ILLEGAL_CHARACTERS_RE = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_RE_TOKEN = re.compile(
+    r"<row\b[^>]*?/>|<row\b[^>]*>|</row>|<c\b[^>]*?/>|<c\b[^>]*>.*?</c>",
+    re.S,
+)
+_RE_ATTR_R = re.compile(r'\br="([A-Z]+)(\d+)"')
+_RE_ATTR_S = re.compile(r'\bs="(\d+)"')
+_RE_MERGE = re.compile(r'<mergeCell\b[^>]*\bref="([A-Z]+\d+):([A-Z]+\d+)"')
+_RE_COORD = re.compile(r"^([A-Z]+)(\d+)$")
+_RE_COL = re.compile(r"<col\b[^>]*>")
+_RE_ROW_HT = re.compile(r'\bht="([\d.]+)"')
+
+# largura de coluna do Excel (em caracteres do "0" da fonte padrão) -> pontos
+_PONTOS_POR_CARACTERE = 7 * 0.75
+
+
+def coluna_para_indice(coluna: str) -> int:
+    indice = 0
+    for letra in coluna:
+        indice = indice * 26 + (ord(letra) - 64)
+    return indice
+
+
+def indice_para_coluna(indice: int) -> str:
+    letras = ""
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+def separar_coord(coord: str) -> tuple:
+    match = _RE_COORD.match(coord.upper())
+    if not match:
+        raise ValueError(f"Coordenada inválida: {coord}")
+    return coluna_para_indice(match.group(1)), int(match.group(2))
+
+
+class _Linha:
+    __slots__ = ("numero", "inicio", "fim", "fim_interno", "auto_fechada", "abertura", "celulas")
+
+    def __init__(self, numero, inicio, abertura, auto_fechada):
+        self.numero = numero
+        self.inicio = inicio              # offset do "<row"
+        self.fim = None                   # offset logo após "</row>" (ou "/>")
+        self.fim_interno = None           # offset do "</row>"
+        self.auto_fechada = auto_fechada
+        self.abertura = abertura          # texto da tag de abertura
+        self.celulas = []                 # [(coluna, inicio, fim, estilo)]
+
+
+class TemplateXlsx:
+    """
+    Template XLSX pré-indexado para preenchimento rápido.
+    """
+
+    def __init__(self, xlsx_bytes: bytes):
+        with zipfile.ZipFile(io.BytesIO(xlsx_bytes)) as zf:
+            membros = [(info, zf.read(info.filename)) for info in zf.infolist()]
+            self.planilha = self._localizar_planilha_ativa(zf)
+
+        self._indexar_planilha(dict((i.filename, d) for i, d in membros)[self.planilha].decode("utf-8"))
+        self._preparar_zip(membros)
+
+    # -------------------------------------------------
+    # PRÉ-PROCESSAMENTO
+    # -------------------------------------------------
+
+    @staticmethod
+    def _localizar_planilha_ativa(zf: zipfile.ZipFile) -> str:
+        workbook = zf.read("xl/workbook.xml").decode("utf-8")
+        rels = zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")
+
+        aba_ativa = 0
+        match = re.search(r'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook)
+        if match:
+            aba_ativa = int(match.group(1))
+
+        rids = re.findall(r'<sheet\b[^>]*\br:id="([^"]+)"', workbook)
+        if not rids:
+            rids = re.findall(r'<sheet\b[^>]*\bid="([^"]+)"', workbook)
+        rid = rids[min(aba_ativa, len(rids) - 1)]
+
+        for rel in re.findall(r"<Relationship\b[^>]*/?>", rels):
+            if re.search(rf'\bId="{re.escape(rid)}"', rel):
+                alvo = re.search(r'\bTarget="([^"]+)"', rel).group(1)
+                if alvo.startswith("/"):
+                    return alvo.lstrip("/")
+                return "xl/" + alvo
+        raise ValueError(f"Planilha ativa ({rid}) não encontrada no workbook")
+
+    def _indexar_planilha(self, xml: str):
+        self.xml = xml
+
+        inicio_dados = xml.find("<sheetData")
+        if inicio_dados < 0:
+            raise ValueError("Planilha sem <sheetData>")
+        fim_tag = xml.index(">", inicio_dados)
+        if xml[fim_tag - 1] == "/":
+            # <sheetData/>: vira <sheetData></sheetData> no patch de inserção
+            self.sheetdata_vazio = (inicio_dados, fim_tag + 1)
+            self.fim_sheetdata = fim_tag + 1
+        else:
+            self.sheetdata_vazio = None
+            self.fim_sheetdata = xml.index("</sheetData>", fim_tag)
+
+        self.linhas = {}
+        self.celulas = {}   # (coluna, linha) -> (inicio, fim, estilo)
+        linha_atual = None
+        for token in _RE_TOKEN.finditer(xml, fim_tag + 1, self.fim_sheetdata):
+            texto = token.group(0)
+            if texto.startswith("<row"):
+                numero = int(re.search(r'\br="(\d+)"', texto).group(1))
+                auto_fechada = texto.endswith("/>")
+                linha_atual = _Linha(numero, token.start(), texto, auto_fechada)
+                self.linhas[numero] = linha_atual
+                if auto_fechada:
+                    linha_atual.fim = token.end()
+                    linha_atual = None
+            elif texto == "</row>":
+                linha_atual.fim_interno = token.start()
+                linha_atual.fim = token.end()
+                linha_atual = None
+            else:
+                abertura = texto[:texto.index(">") + 1]
+                col_letras, numero = _RE_ATTR_R.search(abertura).groups()
+                estilo = _RE_ATTR_S.search(abertura)
+                coluna = coluna_para_indice(col_letras)
+                celula = (token.start(), token.end(), estilo.group(1) if estilo else None)
+                self.celulas[(coluna, int(numero))] = celula
+                linha_atual.celulas.append((coluna,) + celula)
+
+        self.numeros_linhas = sorted(self.linhas)
+
+        # células mescladas -> superior esquerda
+        self.mescladas = {}
+        self.intervalos = {}    # superior esquerda -> inferior direita
+        for inicio, fim in _RE_MERGE.findall(xml):
+            c1, l1 = separar_coord(inicio)
+            c2, l2 = separar_coord(fim)
+            self.intervalos[(c1, l1)] = (c2, l2)
+            for linha in range(l1, l2 + 1):
+                for coluna in range(c1, c2 + 1):
+                    if (coluna, linha) != (c1, l1):
+                        self.mescladas[(coluna, linha)] = (c1, l1)
+
+        # geometria (larguras de coluna, alturas de linha, escala de impressão)
+        formato = re.search(r"<sheetFormatPr\b[^>]*>", xml)
+        formato = formato.group(0) if formato else ""
+        largura = re.search(r'\bdefaultColWidth="([\d.]+)"', formato)
+        altura = re.search(r'\bdefaultRowHeight="([\d.]+)"', formato)
+        self.largura_padrao = float(largura.group(1)) if largura else 9.140625
+        self.altura_padrao = float(altura.group(1)) if altura else 15.0
+        self.larguras = []      # (coluna inicial, coluna final, largura)
+        for col in _RE_COL.findall(xml):
+            minimo = re.search(r'\bmin="(\d+)"', col)
+            maximo = re.search(r'\bmax="(\d+)"', col)
+            largura = re.search(r'\bwidth="([\d.]+)"', col)
+            if minimo and maximo and largura:
+                self.larguras.append((int(minimo.group(1)), int(maximo.group(1)), float(largura.group(1))))
+        escala = re.search(r'<pageSetup\b[^>]*\bscale="(\d+)"', xml)
+        self.escala_impressao = int(escala.group(1)) / 100 if escala else 1.0
+
+    def _preparar_zip(self, membros):
+        """
+        Monta, uma vez só, os registros locais (cabeçalho + dados comprimidos)
+        de todos os membros que não mudam e as entradas correspondentes do
+        diretório central. A planilha vai por último em cada zip gerado.
+        """
+        prefixo = io.BytesIO()
+        self._central = []
+        for info, dados in membros:
+            if info.filename == self.planilha:
+                self._info_planilha = info
+                continue
+            comprimido = _comprimir(dados) if info.compress_type == zipfile.ZIP_DEFLATED else dados
+            metodo = zipfile.ZIP_DEFLATED if info.compress_type == zipfile.ZIP_DEFLATED else zipfile.ZIP_STORED
+            self._central.append(_escrever_membro(prefixo, info.filename, info.date_time, metodo, dados, comprimido))
+        self._prefixo = prefixo.getvalue()
+
+    # -------------------------------------------------
+    # PREENCHIMENTO
+    # -------------------------------------------------
+
+    def resolver(self, coord: str) -> tuple:
+        """
+        (coluna, linha) onde o valor de `coord` deve ser gravado,
+        seguindo a mesma regra do set_cell_value_safely.
+        """
+        alvo = separar_coord(coord)
+        return self.mescladas.get(alvo, alvo)
+
+    def largura_coluna(self, coluna: int) -> float:
+        for minimo, maximo, largura in self.larguras:
+            if minimo <= coluna <= maximo:
+                return largura
+        return self.largura_padrao
+
+    def altura_linha(self, numero: int) -> float:
+        linha = self.linhas.get(numero)
+        ht = _RE_ROW_HT.search(linha.abertura) if linha is not None else None
+        return float(ht.group(1)) if ht else self.altura_padrao
+
+    def tamanho_intervalo(self, alvo: tuple) -> tuple:
+        """
+        (largura, altura) em pontos, na escala de impressão, da célula `alvo`
+        (já resolvida) ou do intervalo mesclado que começa nela.
+        """
+        c1, l1 = alvo
+        c2, l2 = self.intervalos.get(alvo, alvo)
+        largura = sum(self.largura_coluna(c) for c in range(c1, c2 + 1)) * _PONTOS_POR_CARACTERE
+        altura = sum(self.altura_linha(l) for l in range(l1, l2 + 1))
+        return largura * self.escala_impressao, altura * self.escala_impressao
+
+    def gerar_xml(self, campos: dict) -> str:
+        """
+        Aplica {coordenada: valor} sobre o XML indexado e devolve o XML novo.
+        """
+        valores = {}
+        for coord, valor in campos.items():
+            valores[self.resolver(coord)] = valor
+
+        por_linha = {}
+        for (coluna, linha), valor in valores.items():
+            por_linha.setdefault(linha, []).append((coluna, valor))
+
+        # (inicio, fim, ordem, texto); na mesma posição, inserções (ordem =
+        # coluna/linha) vêm antes da substituição da célula que já está ali
+        substituicao = 10 ** 9
+        patches = []
+        for numero, celulas in por_linha.items():
+            celulas.sort()
+            linha = self.linhas.get(numero)
+
+            if linha is None:
+                # linha não existe: insere antes da próxima linha (ou no fim do sheetData)
+                pos = self._posicao_nova_linha(numero)
+                texto = f'<row r="{numero}">' + "".join(
+                    _xml_celula(coluna, numero, None, valor) for coluna, valor in celulas
+                ) + "</row>"
+                patches.append((pos, pos, numero, texto))
+                continue
+
+            if linha.auto_fechada:
+                # <row .../> -> reescreve a linha inteira com as células novas
+                abertura = linha.abertura[:-2].rstrip() + ">"
+                texto = abertura + "".join(
+                    _xml_celula(coluna, numero, None, valor) for coluna, valor in celulas
+                ) + "</row>"
+                patches.append((linha.inicio, linha.fim, substituicao, texto))
+                continue
+
+            for coluna, valor in celulas:
+                existente = self.celulas.get((coluna, numero))
+                if existente:
+                    inicio, fim, estilo = existente
+                    patches.append((inicio, fim, substituicao, _xml_celula(coluna, numero, estilo, valor)))
+                else:
+                    pos = linha.fim_interno
+                    for col_existente, inicio, _, _ in linha.celulas:
+                        if col_existente > coluna:
+                            pos = inicio
+                            break
+                    patches.append((pos, pos, coluna, _xml_celula(coluna, numero, None, valor)))
+
+        if self.sheetdata_vazio and any(p[0] == p[1] == self.fim_sheetdata for p in patches):
+            inicio, fim = self.sheetdata_vazio
+            patches.append((inicio, fim, -1, "<sheetData>"))
+            patches.append((fim, fim, float("inf"), "</sheetData>"))
+
+        patches.sort(key=lambda p: (p[0], p[2]))
+        partes = []
+        cursor = 0
+        for inicio, fim, _, texto in patches:
+            partes.append(self.xml[cursor:inicio])
+            partes.append(texto)
+            cursor = fim
+        partes.append(self.xml[cursor:])
+        return "".join(partes)
+
+    def _posicao_nova_linha(self, numero: int) -> int:
+        for existente in self.numeros_linhas:
+            if existente > numero:
+                return self.linhas[existente].inicio
+        return self.fim_sheetdata
+
+    def preencher(self, campos: dict, destino=None) -> bytes:
+        """
+        Gera o XLSX preenchido. Se `destino` for informado, grava em disco;
+        sempre retorna os bytes do arquivo.
+        """
+        xml = self.gerar_xml(campos).encode("utf-8")
+
+        saida = io.BytesIO()
+        saida.write(self._prefixo)
+        central = list(self._central)
+        central.append(_escrever_membro(
+            saida, self.planilha, self._info_planilha.date_time,
+            zipfile.ZIP_DEFLATED, xml, _comprimir(xml), deslocamento=len(self._prefixo),
+        ))
+        _escrever_diretorio_central(saida, central)
+
+        conteudo = saida.getvalue()
+        if destino is not None:
+            Path(destino).write_bytes(conteudo)
+        return conteudo
+
+
+# -------------------------------------------------
+# XML DAS CÉLULAS
+# -------------------------------------------------
+
+def _xml_celula(coluna: int, linha: int, estilo, valor) -> str:
+    attrs = f'r="{indice_para_coluna(coluna)}{linha}"'
+    if estilo is not None:
+        attrs += f' s="{estilo}"'
+
+    if valor is None or valor == "":
+        return f"<c {attrs}/>"
+
+    if isinstance(valor, bool):
+        return f'<c {attrs} t="b"><v>{int(valor)}</v></c>'
+
+    if isinstance(valor, (int, float)):
+        return f"<c {attrs}><v>{valor!r}</v></c>"
+
+    if isinstance(valor, datetime):
+        valor = valor.isoformat()
+
+    texto = str(valor)
+    if _ILLEGAL_CHARACTERS_RE.search(texto):
+        raise ValueError(f"Caractere inválido no valor da célula {indice_para_coluna(coluna)}{linha}")
+
+    if texto.startswith("=") and len(texto) > 1:
+        # mesmo comportamento do openpyxl: string começando com "=" é fórmula
+        return f"<c {attrs}><f>{escape(texto[1:])}</f><v></v></c>"
+
+    return f'<c {attrs} t="inlineStr"><is><t xml:space="preserve">{escape(texto)}</t></is></c>'
+
+
+# -------------------------------------------------
+# ZIP
+# -------------------------------------------------
+
+def _comprimir(dados: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    return compressor.compress(dados) + compressor.flush()
+
+
+def _dos_datetime(date_time) -> tuple:
+    ano, mes, dia, hora, minuto, segundo = date_time
+    data = (max(ano, 1980) - 1980) << 9 | mes << 5 | dia
+    tempo = hora << 11 | minuto << 5 | (segundo // 2)
+    return tempo, data
+
+
+def _escrever_membro(saida, nome, date_time, metodo, dados, comprimido, deslocamento=None) -> bytes:
+    """
+    Escreve o registro local do membro em `saida` e devolve a entrada
+    correspondente do diretório central.
+    """
+    if deslocamento is None:
+        deslocamento = saida.tell()
+    nome_bytes = nome.encode("utf-8")
+    flags = 0x800 if not nome.isascii() else 0
+    crc = zlib.crc32(dados)
+    tempo, data = _dos_datetime(date_time)
+
+    saida.write(struct.pack(
+        "<IHHHHHIIIHH", 0x04034B50, 20, flags, metodo, tempo, data,
+        crc, len(comprimido), len(dados), len(nome_bytes), 0,
+    ))
+    saida.write(nome_bytes)
+    saida.write(comprimido)
+
+    return struct.pack(
+        "<IHHHHHHIIIHHHHHII", 0x02014B50, 20, 20, flags, metodo, tempo, data,
+        crc, len(comprimido), len(dados), len(nome_bytes), 0, 0, 0, 0, 0, deslocamento,
+    ) + nome_bytes
+
+
+def _escrever_diretorio_central(saida, entradas):
+    inicio = saida.tell()
+    for entrada in entradas:
+        saida.write(entrada)
+    tamanho = saida.tell() - inicio
+    saida.write(struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, len(entradas), len(entradas), tamanho, inicio, 0,
+    ))